@@ -82,7 +82,7 @@ class RunningDecoder(ActivityDecoder):
 
         output = pd.DataFrame()
         for field_to_extract in fields_to_extract:
-            output[field_to_extract] = [record.__dict__[field_to_extract] for record in records]
+            output[field_to_extract] = [getattr(record, field_to_extract) for record in records]
 
         return output
 
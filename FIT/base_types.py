@@ -49,11 +49,12 @@ class FITValueDecodingError(Exception):
     pass
 
 
-def from_bytes(c, raw_bytes: bytes):
+def from_bytes(c, raw_bytes: bytes, byte_order: str = '<'):
+    # byte_order is '<' or '>', the bytes are swapped by NumPy for the whole buffer when it differs from the native order
     if (len(raw_bytes) % c.metadata().underlying_bytes) != 0:
         raise FITValueDecodingError('{} expected to be multiple of {} bytes, {} received', BASE_TYPE_NAME_MAP[c.metadata.fit_name], c.metadata().underlying_bytes, len(raw_bytes))
 
-    array = np.frombuffer(raw_bytes, dtype=c.metadata().numpy_type)
+    array = np.frombuffer(raw_bytes, dtype=np.dtype(c.metadata().numpy_type).newbyteorder(byte_order))
 
     if len(array) == 1:
         return c(array[0])
@@ -68,8 +69,8 @@ class FITEnum(np.uint8, BaseType):
         return TypeMetadata(0, False, int('0x00', 16), int('0xFF', 16), 1, 'enum', np.uint8)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["FITEnum", Tuple["FITEnum"]]:
-        return from_bytes(FITEnum, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["FITEnum", Tuple["FITEnum"]]:
+        return from_bytes(FITEnum, raw_bytes, byte_order)
 
 
 class UnsignedInt8(np.uint8, BaseType):
@@ -79,8 +80,8 @@ class UnsignedInt8(np.uint8, BaseType):
         return TypeMetadata(2, False, int('0x02', 16), int('0xFF', 16), 1, 'uint8', np.uint8)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["UnsignedInt8", Tuple["UnsignedInt8"]]:
-        return from_bytes(UnsignedInt8, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["UnsignedInt8", Tuple["UnsignedInt8"]]:
+        return from_bytes(UnsignedInt8, raw_bytes, byte_order)
 
 
 class SignedInt8(np.int8, BaseType):
@@ -90,8 +91,8 @@ class SignedInt8(np.int8, BaseType):
         return TypeMetadata(1, False, int('0x01', 16), int('0x7F', 16), 1, 'sint8', np.int8)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["SignedInt8", Tuple["SignedInt8"]]:
-        return from_bytes(SignedInt8, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["SignedInt8", Tuple["SignedInt8"]]:
+        return from_bytes(SignedInt8, raw_bytes, byte_order)
 
 
 class SignedInt16(np.int16, BaseType):
@@ -101,8 +102,8 @@ class SignedInt16(np.int16, BaseType):
         return TypeMetadata(3, True, int('0x83', 16), int('0x7FFF', 16), 2, 'sint16', np.int16)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["SignedInt16", Tuple["SignedInt16"]]:
-        return from_bytes(SignedInt16, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["SignedInt16", Tuple["SignedInt16"]]:
+        return from_bytes(SignedInt16, raw_bytes, byte_order)
 
 
 class UnsignedInt16(np.uint16, BaseType):
@@ -112,8 +113,8 @@ class UnsignedInt16(np.uint16, BaseType):
         return TypeMetadata(4, True, int('0x84', 16), int('0xFFFF', 16), 2, 'uint16', np.uint16)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["UnsignedInt16", Tuple["UnsignedInt16"]]:
-        return from_bytes(UnsignedInt16, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["UnsignedInt16", Tuple["UnsignedInt16"]]:
+        return from_bytes(UnsignedInt16, raw_bytes, byte_order)
 
 
 class SignedInt32(np.int32, BaseType):
@@ -123,8 +124,8 @@ class SignedInt32(np.int32, BaseType):
         return TypeMetadata(5, True, int('0x85', 16), int('0x7FFFFFFF', 16), 4, 'sint32', np.int32)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["SignedInt32", Tuple["SignedInt32"]]:
-        return from_bytes(SignedInt32, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["SignedInt32", Tuple["SignedInt32"]]:
+        return from_bytes(SignedInt32, raw_bytes, byte_order)
 
 
 class UnsignedInt32(np.uint32, BaseType):
@@ -134,19 +135,25 @@ class UnsignedInt32(np.uint32, BaseType):
         return TypeMetadata(6, True, int('0x86', 16), int('0xFFFFFFFF', 16), 4, 'uint32', np.uint32)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["UnsignedInt32", Tuple["UnsignedInt32"]]:
-        return from_bytes(UnsignedInt32, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["UnsignedInt32", Tuple["UnsignedInt32"]]:
+        return from_bytes(UnsignedInt32, raw_bytes, byte_order)
 
 
 class String(str, BaseType):
+    def __new__(cls, value=''):
+        # Strings are null terminated UTF-8, padded with null bytes up to the size of the field
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            value = bytes(value).split(b'\x00', 1)[0].decode('utf-8', errors='replace')
+        return super().__new__(cls, value)
+
     @staticmethod
     @functools.lru_cache(1)
     def metadata() -> TypeMetadata:
         return TypeMetadata(7, False, int('0x07', 16), int('0x00', 16), 1, 'string', str)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["String", Tuple["String"]]:
-        return String(raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["String", Tuple["String"]]:
+        return String(bytes(raw_bytes))
 
 
 class Float32(np.float32, BaseType):
@@ -156,8 +163,8 @@ class Float32(np.float32, BaseType):
         return TypeMetadata(8, True, int('0x88', 16), int('0xFFFFFFFF', 16), 4, 'float32', np.float32)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["Float32", Tuple["Float32"]]:
-        return from_bytes(Float32, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["Float32", Tuple["Float32"]]:
+        return from_bytes(Float32, raw_bytes, byte_order)
 
 
 class Float64(np.float64, BaseType):
@@ -167,8 +174,8 @@ class Float64(np.float64, BaseType):
         return TypeMetadata(9, True, int('0x89', 16), int('0xFFFFFFFFFFFFFFFF', 16), 8, 'float64', np.float64)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["Float64", Tuple["Float64"]]:
-        return from_bytes(Float64, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["Float64", Tuple["Float64"]]:
+        return from_bytes(Float64, raw_bytes, byte_order)
 
 
 class UnsignedInt8z(np.uint8, BaseType):
@@ -178,8 +185,8 @@ class UnsignedInt8z(np.uint8, BaseType):
         return TypeMetadata(10, False, int('0x0A', 16), int('0x00', 16), 1, 'uint8z', np.uint8)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["UnsignedInt8z", Tuple["UnsignedInt8z"]]:
-        return from_bytes(UnsignedInt8z, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["UnsignedInt8z", Tuple["UnsignedInt8z"]]:
+        return from_bytes(UnsignedInt8z, raw_bytes, byte_order)
 
 
 class UnsignedInt16z(np.uint16, BaseType):
@@ -189,8 +196,8 @@ class UnsignedInt16z(np.uint16, BaseType):
         return TypeMetadata(11, True, int('0x8B', 16), int('0x0000', 16), 2, 'uint16z', np.uint16)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["UnsignedInt16z", Tuple["UnsignedInt16z"]]:
-        return from_bytes(UnsignedInt16z, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["UnsignedInt16z", Tuple["UnsignedInt16z"]]:
+        return from_bytes(UnsignedInt16z, raw_bytes, byte_order)
 
 
 class UnsignedInt32z(np.uint32, BaseType):
@@ -200,8 +207,8 @@ class UnsignedInt32z(np.uint32, BaseType):
         return TypeMetadata(12, True, int('0x8C', 16), int('0x00000000', 16), 4, 'uint32z', np.uint32)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["UnsignedInt32z", Tuple["UnsignedInt32z"]]:
-        return from_bytes(UnsignedInt32z, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["UnsignedInt32z", Tuple["UnsignedInt32z"]]:
+        return from_bytes(UnsignedInt32z, raw_bytes, byte_order)
 
 
 class Byte(np.uint8, BaseType):
@@ -211,8 +218,8 @@ class Byte(np.uint8, BaseType):
         return TypeMetadata(13, False, int('0x0D', 16), int('0xFF', 16), 1, 'byte', np.uint8)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["Byte", Tuple["Byte"]]:
-        return from_bytes(Byte, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["Byte", Tuple["Byte"]]:
+        return from_bytes(Byte, raw_bytes, byte_order)
 
 
 class SignedInt64(np.int64, BaseType):
@@ -222,8 +229,8 @@ class SignedInt64(np.int64, BaseType):
         return TypeMetadata(14, True, int('0x8E', 16), int('0x7FFFFFFFFFFFFFFF', 16), 8, 'sint64', np.int64)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["SignedInt64", Tuple["SignedInt64"]]:
-        return from_bytes(SignedInt64, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["SignedInt64", Tuple["SignedInt64"]]:
+        return from_bytes(SignedInt64, raw_bytes, byte_order)
 
 
 class UnsignedInt64(np.uint64, BaseType):
@@ -233,8 +240,8 @@ class UnsignedInt64(np.uint64, BaseType):
         return TypeMetadata(15, True, int('0x8F', 16), int('0xFFFFFFFFFFFFFFFF', 16), 8, 'uint64', np.uint64)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["UnsignedInt64", Tuple["UnsignedInt64"]]:
-        return from_bytes(UnsignedInt64, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["UnsignedInt64", Tuple["UnsignedInt64"]]:
+        return from_bytes(UnsignedInt64, raw_bytes, byte_order)
 
 
 class UnsignedInt64z(np.uint64, BaseType):
@@ -244,8 +251,8 @@ class UnsignedInt64z(np.uint64, BaseType):
         return TypeMetadata(16, True, int('0x90', 16), int('0x0000000000000000', 16), 8, 'uint64z', np.uint64)
 
     @staticmethod
-    def from_bytes(raw_bytes: bytes) -> Union["UnsignedInt64z", Tuple["UnsignedInt64z"]]:
-        return from_bytes(UnsignedInt64z, raw_bytes)
+    def from_bytes(raw_bytes: bytes, byte_order: str = '<') -> Union["UnsignedInt64z", Tuple["UnsignedInt64z"]]:
+        return from_bytes(UnsignedInt64z, raw_bytes, byte_order)
 
 
 BASE_TYPE_NUMBER_TO_CLASS = {
@@ -267,3 +274,18 @@ BASE_TYPE_NUMBER_TO_CLASS = {
     UnsignedInt64.metadata().base_type_number: UnsignedInt64,
     UnsignedInt64z.metadata().base_type_number: UnsignedInt64z,
 }
+
+
+# Formats used by the struct module to unpack each of the numpy types, in standard size mode
+NUMPY_TYPE_TO_STRUCT_FORMAT = {
+    np.int8: 'b',
+    np.uint8: 'B',
+    np.int16: 'h',
+    np.uint16: 'H',
+    np.int32: 'i',
+    np.uint32: 'I',
+    np.int64: 'q',
+    np.uint64: 'Q',
+    np.float32: 'f',
+    np.float64: 'd',
+}
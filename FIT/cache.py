@@ -0,0 +1,173 @@
+# Copyright 2019 Joan Puig
+# See LICENSE for details
+
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Dict, Optional, Union, List, Tuple
+
+import numpy as np
+
+from FIT.decoder import Decoder, MessageSelection, FieldProjection, FITGeneratedCodeNotFoundError
+
+
+class DecodeCache:
+    """
+    Content addressed on disk cache of the columnar decode of .FIT files
+    An entry is keyed by the SHA-256 of the file bytes, the decoder options and the profile version of the generated code,
+    so a renamed or copied file still hits the cache while a change of options or profile never returns stale arrays
+    Each entry is a directory with one .npy file per global message number, on a hit the arrays are memory mapped read only
+    Entries are written to a temporary directory and renamed into place, and renamed away before being deleted,
+    so several processes can share the same cache directory without ever seeing a partial entry
+    The least recently used entries are evicted once the entries add up to more than max_size bytes
+    """
+
+    # Bumped whenever the columnar layout changes, so entries written by older versions are never loaded
+    FORMAT_VERSION = 1
+
+    TEMPORARY_PREFIX = 'tmp-'
+
+    # Temporary directories older than this, in seconds, were left behind by a process that died while writing
+    STALE_TEMPORARY_AGE = 3600
+
+    READ_CHUNK_SIZE = 1 << 20
+
+    def __init__(self, directory: Union[str, os.PathLike], max_size: int = 1 << 30, memory_map: bool = True):
+        self.directory = os.fspath(directory)
+        self.max_size = max_size
+        self.memory_map = memory_map
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def file_digest(file_name: Union[str, os.PathLike]) -> str:
+        digest = hashlib.sha256()
+        with open(file_name, 'rb') as file:
+            for chunk in iter(lambda: file.read(DecodeCache.READ_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def profile_version() -> str:
+        try:
+            from FIT.messages import PROFILE_VERSION
+        except ModuleNotFoundError:
+            raise FITGeneratedCodeNotFoundError('Unable to load FIT.messages, make sure you have generated the code first')
+
+        return PROFILE_VERSION.name
+
+    @staticmethod
+    def options_key(include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> str:
+        # The options are resolved the way the decoder resolves them, so equivalent selections share their entries
+        include = sorted(Decoder.message_numbers(include_messages)) if include_messages is not None else None
+        exclude = sorted(Decoder.message_numbers(exclude_messages)) if exclude_messages is not None else []
+        resolved_projection = sorted([(number, sorted(fields)) for number, fields in Decoder.resolve_projection(projection).items()]) if projection is not None else []
+        return repr((DecodeCache.FORMAT_VERSION, DecodeCache.profile_version(), include, exclude, resolved_projection))
+
+    @staticmethod
+    def key(file_digest: str, options_key: str) -> str:
+        return hashlib.sha256(f'{file_digest}\n{options_key}'.encode('utf-8')).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def decode_fit_columnar(self, file_name: Union[str, os.PathLike], include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> Dict[int, np.ndarray]:
+        # Same result as Decoder.decode_fit_columnar, decoding the file only if it is not already in the cache
+        key = DecodeCache.key(DecodeCache.file_digest(file_name), DecodeCache.options_key(include_messages, exclude_messages, projection))
+
+        columns = self.load(key)
+        if columns is None:
+            columns = Decoder.decode_fit_columnar(os.fspath(file_name), include_messages, exclude_messages, projection)
+            self.store(key, columns)
+
+        return columns
+
+    def load(self, key: str) -> Optional[Dict[int, np.ndarray]]:
+        path = self.entry_path(key)
+        try:
+            columns = {}
+            for file_name in os.listdir(path):
+                number, extension = os.path.splitext(file_name)
+                if extension == '.npy':
+                    columns[int(number)] = np.load(os.path.join(path, file_name), mmap_mode='r' if self.memory_map else None, allow_pickle=False)
+
+            # The modification time of the entry is its last use
+            os.utime(path)
+        except FileNotFoundError:
+            # Missing or evicted by another process while it was being read
+            return None
+        except (ValueError, OSError):
+            # Truncated or corrupted, the entry is dropped so the file is decoded and stored again
+            self.remove(key)
+            return None
+
+        return dict(sorted(columns.items()))
+
+    def store(self, key: str, columns: Dict[int, np.ndarray]) -> None:
+        temporary_path = tempfile.mkdtemp(prefix=DecodeCache.TEMPORARY_PREFIX, dir=self.directory)
+        try:
+            for global_message_number, column in columns.items():
+                np.save(os.path.join(temporary_path, f'{global_message_number}.npy'), column, allow_pickle=False)
+            os.rename(temporary_path, self.entry_path(key))
+        except OSError:
+            # Another process stored the same entry first, both hold the same arrays
+            shutil.rmtree(temporary_path, ignore_errors=True)
+            if not os.path.isdir(self.entry_path(key)):
+                raise
+
+        self.evict()
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        # Last use, size in bytes and key of every entry, least recently used first
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(DecodeCache.TEMPORARY_PREFIX):
+                continue
+
+            try:
+                size = sum([entry.stat().st_size for entry in os.scandir(path)])
+                entries.append((os.stat(path).st_mtime, size, name))
+            except FileNotFoundError:
+                continue
+
+        return sorted(entries)
+
+    def remove_stale_temporaries(self) -> None:
+        # Temporary directories left behind by processes that died while storing or removing an entry
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.startswith(DecodeCache.TEMPORARY_PREFIX) and time.time() - os.stat(path).st_mtime > DecodeCache.STALE_TEMPORARY_AGE:
+                    shutil.rmtree(path, ignore_errors=True)
+            except FileNotFoundError:
+                continue
+
+    def evict(self) -> None:
+        self.remove_stale_temporaries()
+        entries = self.entries()
+        total_size = sum([size for _, size, _ in entries])
+        for _, size, key in entries:
+            if total_size <= self.max_size:
+                break
+
+            self.remove(key)
+            total_size = total_size - size
+
+    def remove(self, key: str) -> None:
+        # Renamed first so no process loads a half deleted entry, arrays already memory mapped stay valid
+        removed_path = os.path.join(self.directory, f'{DecodeCache.TEMPORARY_PREFIX}{uuid.uuid4().hex}')
+        try:
+            os.rename(self.entry_path(key), removed_path)
+        except FileNotFoundError:
+            return
+
+        shutil.rmtree(removed_path, ignore_errors=True)
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            if not name.startswith(DecodeCache.TEMPORARY_PREFIX):
+                self.remove(name)
@@ -6,13 +6,19 @@ import importlib
 import keyword
 import datetime
 
+from enum import Enum, auto
+
 import networkx as nx
+import numpy as np
 
 from pathlib import Path
-from typing import Iterable, Optional, List
+from typing import Iterable, Optional, List, Dict, Tuple
 
 from FIT.profile import Profile, MessageScalarFieldProfile, MessageComponentFieldProfile
+import FIT.base_types
+
 from FIT.base_types import BASE_TYPE_NAME_MAP
+from FIT.decoder import Decoder
 
 
 class CodeWriterError(Exception):
@@ -261,10 +267,23 @@ class TypeCodeGenerator(CodeGenerator):
         return CodeGenerator._generate(code_generator, output_file)
 
 
+class MessageStorage(Enum):
+    """
+    How the generated message classes store their field values
+    """
+    # Frozen dataclasses, the values live in the instance __dict__
+    Dict = auto()
+    # Frozen dataclasses with __slots__, no instance __dict__
+    Slots = auto()
+    # SparseMessage subclasses, only the values that are present are stored, next to a presence bitmap
+    Sparse = auto()
+
+
 class MessageCodeGenerator(CodeGenerator):
 
-    def __init__(self, profile: Profile, code_writer: CodeWriter = None):
+    def __init__(self, profile: Profile, code_writer: CodeWriter = None, storage: MessageStorage = MessageStorage.Dict):
         super().__init__(profile, code_writer)
+        self.storage = storage
 
     def _generate_full(self):
         self._generate_header()
@@ -281,16 +300,20 @@ class MessageCodeGenerator(CodeGenerator):
         cw = self.code_writer
         cw.write('import warnings')
         cw.write('import functools')
-        cw.write('from typing import Tuple, Dict, Union')
+        cw.write('from typing import Tuple, Dict, Union, Optional')
         cw.write('from enum import Enum, auto')
         cw.write('from dataclasses import dataclass')
         cw.new_line()
+        cw.write('import numpy as np')
+        cw.new_line()
         self._generate_base_type_imports()
         cw.new_line()
         cw.write('import FIT.types')
-        cw.write('from FIT.model import Record, Message, MessageDefinition, FieldDefinition, RecordField, FieldMetadata, MessageMetadata, DeveloperMessageField, UndocumentedMessageField')
+        cw.write('from FIT.model import Record, Message, MessageDefinition, FieldDefinition, RecordField, FieldMetadata, MessageMetadata, DeveloperMessageField, UndocumentedMessageField, ComponentExpansion')
+        if self.storage == MessageStorage.Sparse:
+            cw.write('from FIT.model import SparseMessage, SparseField')
         cw.write('from FIT.profile import ProfileVersion')
-        cw.write('from FIT.decoder import Decoder')
+        cw.write('from FIT.decoder import Decoder, Accumulator')
 
     def _generate_units(self):
         cw = self.code_writer
@@ -309,10 +332,24 @@ class MessageCodeGenerator(CodeGenerator):
 
         for message in messages:
             message_name = CodeGenerator._capitalize_type_name(message.name)
-            cw.write('@dataclass(frozen=True)')
-            cw.write(f'# FIT message name: {message.name}')
-            cw.write(f'class {message_name}(Message):')
-            cw.indent()
+            if self.storage == MessageStorage.Sparse:
+                reserved_names = {'present', 'values', 'sparse_field_names'}.intersection([field.name for field in message.fields])
+                if reserved_names:
+                    raise CodeGeneratorError(f'Message {message.name} has fields with names reserved by SparseMessage: {", ".join(reserved_names)}')
+
+                cw.write(f'# FIT message name: {message.name}')
+                cw.write(f'class {message_name}(SparseMessage):')
+                cw.indent()
+                cw.write('__slots__ = ()')
+                cw.new_line()
+            else:
+                cw.write('@dataclass(frozen=True)')
+                cw.write(f'# FIT message name: {message.name}')
+                cw.write(f'class {message_name}(Message):')
+                cw.indent()
+                if self.storage == MessageStorage.Slots:
+                    cw.write(f'__slots__ = ({"".join([repr(field.name) + ", " for field in message.fields])})')
+                    cw.new_line()
 
             resolved_fields = []
             for field in message.fields:
@@ -329,10 +366,15 @@ class MessageCodeGenerator(CodeGenerator):
                 max_name_length = max([len(resolved_field['name']) for resolved_field in resolved_fields])
                 max_type_length = max([len(resolved_field['type']) for resolved_field in resolved_fields])
 
-                for rf in resolved_fields:
+                for i, rf in enumerate(resolved_fields):
                     CodeGenerator._check_valid_name(rf['name'])
-                    fmt = '{:<' + str(max_name_length) + '} : {:<' + str(max_type_length) + '}'
-                    cw.write_fragment(fmt.format(rf['name'], rf['type']))
+                    if self.storage == MessageStorage.Sparse:
+                        # The type is kept as a comment, the position in the constructor arguments is what SparseField needs
+                        fmt = '{:<' + str(max_name_length) + '} = SparseField({:>3})  # {:<' + str(max_type_length) + '}'
+                        cw.write_fragment(fmt.format(rf['name'], i, rf['type']))
+                    else:
+                        fmt = '{:<' + str(max_name_length) + '} : {:<' + str(max_type_length) + '}'
+                        cw.write_fragment(fmt.format(rf['name'], rf['type']))
                     if rf['comment']:
                         cw.write(f'    # {rf["comment"]}')
                     else:
@@ -351,61 +393,307 @@ class MessageCodeGenerator(CodeGenerator):
             cw.unindent()
             cw.new_line()
             cw.write('@staticmethod')
-            cw.write(f'def from_extracted_fields(extracted_fields, developer_fields: Tuple[DeveloperMessageField], undocumented_fields: Tuple[UndocumentedMessageField], error_on_invalid_enum_value: bool) ->  "{message_name}":')
+            cw.write('def field_numbers() -> Dict[str, Tuple[int]]:')
             cw.indent()
-            if len(message.fields) > 0:
-                cw.new_line()
-                order = MessageCodeGenerator._field_extraction_order(message.fields)
-                for i in order:
-                    field = message.fields[i]
-                    if field.number is not None:
-                        if field.type in BASE_TYPE_NAME_MAP:
-                            cw.write(f'{field.name} = Decoder.cast_value(extracted_fields[{field.number}], FIT.base_types.{CodeGenerator._capitalize_type_name(BASE_TYPE_NAME_MAP[field.type])}, error_on_invalid_enum_value)')
-                        else:
-                            cw.write(f'{field.name} = Decoder.cast_value(extracted_fields[{field.number}], FIT.types.{CodeGenerator._capitalize_type_name(field.type)}, error_on_invalid_enum_value)')
+            field_numbers = MessageCodeGenerator._field_numbers(message.fields)
+            cw.write(f'return {{{", ".join([repr(name) + ": " + repr(numbers) for name, numbers in field_numbers.items()])}}}')
+            cw.unindent()
+            cw.new_line()
+            self._generate_numpy_tables(message)
+            cw.write('@staticmethod')
+            cw.write(f'def from_extracted_fields(extracted_fields, developer_fields: Tuple[DeveloperMessageField], undocumented_fields: Tuple[UndocumentedMessageField], error_on_invalid_enum_value: bool, accumulator: Optional[Accumulator] = None) ->  "{message_name}":')
+            cw.indent()
+            self._generate_field_casts(message, message_name, False)
+            cw.new_line()
+            cw.unindent()
+            cw.write('@staticmethod')
+            cw.write(f'def from_field_values(record_fields: Tuple[RecordField], field_positions: Tuple[int], header_timestamp, developer_fields: Tuple[DeveloperMessageField], undocumented_fields: Tuple[UndocumentedMessageField], error_on_invalid_enum_value: bool, accumulator: Optional[Accumulator] = None) ->  "{message_name}":')
+            cw.indent()
+            cw.write('# Fields are read by position, field_positions maps field numbers to positions, and record_fields ends with an empty field that missing numbers (-1) point to')
+            self._generate_field_casts(message, message_name, True)
+            cw.new_line(2)
+            cw.unindent()
+            cw.unindent()
+
+    def _generate_field_casts(self, message, message_name: str, positional: bool):
+        # Body of the message constructors, positional selects between reading the fields from the extracted fields dict or from the record fields by position
+        cw = self.code_writer
+        enum_types = {type_profile.name for type_profile in self.profile.types if type_profile.is_enum}
+
+        if positional:
+            reserved_names = {'raw_value', 'record_fields', 'field_positions', 'header_timestamp', 'accumulator'}.intersection([field.name for field in message.fields])
+            if reserved_names:
+                raise CodeGeneratorError(f'Message {message.name} has fields with names reserved by the generated code: {", ".join(reserved_names)}')
+
+        if len(message.fields) > 0:
+            cw.new_line()
+            order = MessageCodeGenerator._field_extraction_order(message.fields)
+            expansions = self._component_expansions(message)
+            for i in order:
+                field = message.fields[i]
+                if field.number is not None:
+                    if field.type in BASE_TYPE_NAME_MAP:
+                        type_name = f'FIT.base_types.{CodeGenerator._capitalize_type_name(BASE_TYPE_NAME_MAP[field.type])}'
                     else:
-                        cw.write(f'{field.name} = None')
-                        reinterpreted_field_name = None
-                        for j in range(i, 0, -1):
-                            if message.fields[j].number is not None:
-                                reinterpreted_field_name = message.fields[j].name
-                                break
-
-                        for matcher in field.dynamic_field_matchers:
-                            ref_field_value = matcher.ref_field_value
-                            ref_field_profile = [field for field in message.fields if field.name == matcher.ref_field_name][0]
-                            rftn = CodeGenerator._capitalize_type_name(ref_field_profile.type)
-                            if ref_field_profile.type in BASE_TYPE_NAME_MAP:
-                                if isinstance(ref_field_value, str):
-                                    val = f'FIT.base_types.{rftn}(\'{ref_field_value}\')'
-                                else:
-                                    val = f'FIT.base_types.{rftn}({ref_field_value})'
-                            else:
-                                if isinstance(ref_field_value, str):
-                                    val = f'FIT.types.{rftn}.{CodeGenerator._capitalize_type_name(ref_field_value)}'
-                                else:
-                                    val = f'FIT.types.{rftn}({ref_field_value})'
+                        type_name = f'FIT.types.{CodeGenerator._capitalize_type_name(field.type)}'
 
-                            cw.write(f'if {matcher.ref_field_name} == {val}:')
+                    if not positional:
+                        cw.write(f'{field.name} = Decoder.cast_value(extracted_fields[{field.number}], {type_name}, error_on_invalid_enum_value)')
+                    else:
+                        # Direct construction, or member lookup for enums, Decoder.cast_value only handles missing values, arrays and invalid enum values
+                        cw.write(f'raw_value = record_fields[field_positions[{field.number}]].value')
+                        if field.number == Decoder.TIMESTAMP_FIELD_NUMBER:
+                            cw.write('if raw_value is None:')
                             cw.indent()
-                            if field.type in BASE_TYPE_NAME_MAP:
-                                cw.write(f'{field.name} = Decoder.cast_value({reinterpreted_field_name}, FIT.base_types.{CodeGenerator._capitalize_type_name(BASE_TYPE_NAME_MAP[field.type])}, error_on_invalid_enum_value)')
-                            else:
-                                cw.write(f'{field.name} = Decoder.cast_value({reinterpreted_field_name}, FIT.types.{CodeGenerator._capitalize_type_name(field.type)}, error_on_invalid_enum_value)')
+                            cw.write('raw_value = header_timestamp')
+                            cw.unindent()
 
+                        if field.type in enum_types:
+                            cw.write(f'{field.name} = {type_name}._value2member_map_.get(raw_value) if raw_value.__class__ is not tuple else None')
+                            cw.write(f'if {field.name} is None and raw_value is not None:')
+                            cw.indent()
+                            cw.write(f'{field.name} = Decoder.cast_value(raw_value, {type_name}, error_on_invalid_enum_value)')
                             cw.unindent()
-                            # TODO components
+                        else:
+                            cw.write(f'{field.name} = None if raw_value is None else {type_name}(raw_value) if raw_value.__class__ is not tuple else Decoder.cast_value(raw_value, {type_name}, error_on_invalid_enum_value)')
+                else:
+                    cw.write(f'{field.name} = None')
+                    reinterpreted_field = MessageCodeGenerator._reinterpreted_field(message.fields, i)
+                    reinterpreted_field_name = reinterpreted_field.name if reinterpreted_field is not None else None
+
+                    for matcher in field.dynamic_field_matchers:
+                        ref_field_value = matcher.ref_field_value
+                        ref_field_profile = message.fields_by_name[matcher.ref_field_name]
+                        rftn = CodeGenerator._capitalize_type_name(ref_field_profile.type)
+                        if ref_field_profile.type in BASE_TYPE_NAME_MAP:
+                            if isinstance(ref_field_value, str):
+                                val = f'FIT.base_types.{rftn}(\'{ref_field_value}\')'
+                            else:
+                                val = f'FIT.base_types.{rftn}({ref_field_value})'
+                        else:
+                            if isinstance(ref_field_value, str):
+                                val = f'FIT.types.{rftn}.{CodeGenerator._capitalize_type_name(ref_field_value)}'
+                            else:
+                                val = f'FIT.types.{rftn}({ref_field_value})'
 
-            common_fields = ['developer_fields', 'undocumented_fields']
-            cw.new_line()
-            cw.write(f'return {message_name}({", ".join(common_fields + [m.name for m in message.fields])})')
-            cw.new_line(2)
-            cw.unindent()
+                        cw.write(f'if {matcher.ref_field_name} == {val}:')
+                        cw.indent()
+                        if field.type in BASE_TYPE_NAME_MAP:
+                            cw.write(f'{field.name} = Decoder.cast_value({reinterpreted_field_name}, FIT.base_types.{CodeGenerator._capitalize_type_name(BASE_TYPE_NAME_MAP[field.type])}, error_on_invalid_enum_value)')
+                        else:
+                            cw.write(f'{field.name} = Decoder.cast_value({reinterpreted_field_name}, FIT.types.{CodeGenerator._capitalize_type_name(field.type)}, error_on_invalid_enum_value)')
+
+                        cw.unindent()
+
+                for k, expansion in enumerate(expansions):
+                    if expansion['destination'].name != field.name:
+                        continue
+
+                    if expansion['accumulated']:
+                        # Accumulated components are deltas over the previous messages, their running totals are kept by the accumulator
+                        cw.write('if accumulator is not None:')
+                        cw.indent()
+                        cw.write(f'{field.name} = Decoder.cast_value(Decoder.accumulate_component({expansion["source"].name}, {field.name}, {message_name}.component_expansions()[{k}], {message_name}, accumulator), {self._cast_type_name(field.type)}, error_on_invalid_enum_value)')
+                        cw.unindent()
+                    else:
+                        cw.write(f'if {field.name} is None:')
+                        cw.indent()
+                        cw.write(f'{field.name} = Decoder.cast_value(Decoder.expand_component({expansion["source"].name}, {message_name}.component_expansions()[{k}]), {self._cast_type_name(field.type)}, error_on_invalid_enum_value)')
+                        cw.unindent()
+
+        common_fields = ['developer_fields', 'undocumented_fields']
+        cw.new_line()
+        cw.write(f'return {message_name}({", ".join(common_fields + [m.name for m in message.fields])})')
+
+    def _generate_numpy_tables(self, message):
+        # Per message tables for vectorized decoding, with one entry per field that has a field number, in the order of the fields
+        # Scale and offset convert the stored values to physical units as value / scale - offset, scalar fields without them get 1 and 0
+        cw = self.code_writer
+        fields = [field for field in message.fields if field.number is not None]
+
+        dtype_columns = []
+        base_types = []
+        scales = []
+        offsets = []
+        units = []
+        for field in fields:
+            base_type_name = BASE_TYPE_NAME_MAP[self._base_type(field.type)]
+            numpy_type = getattr(FIT.base_types, base_type_name).metadata().numpy_type
+            # Strings have no fixed width and arrays of undefined length take the shape of the decoded data, only fixed arrays get a shape
+            dtype = np.dtype(object) if numpy_type is str else np.dtype(numpy_type)
+            shape = MessageCodeGenerator._fixed_array_length(field.array)
+            dtype_columns.append(f'({field.name!r}, {dtype.str!r}{", " + str(shape) if shape else ""})')
+            base_types.append(f'FIT.base_types.{base_type_name}')
+
+            scale, offset, field_units = MessageCodeGenerator._field_scale_offset_units(message.name, field)
+            scales.append(scale)
+            offsets.append(offset)
+            if field_units:
+                units.append(f'{field.name!r}: Unit.{field_units}')
+
+        expansions = []
+        for expansion in self._component_expansions(message):
+            source = expansion['source']
+            destination = expansion['destination']
+            expansions.append(f'ComponentExpansion({source.name!r}, {source.number!r}, FIT.base_types.{BASE_TYPE_NAME_MAP[self._base_type(source.type)]}, '
+                              f'{destination.name!r}, {destination.number!r}, FIT.base_types.{BASE_TYPE_NAME_MAP[self._base_type(destination.type)]}, '
+                              f'{expansion["bit_offset"]}, {expansion["bits"]}, {expansion["factor"]!r}, {expansion["shift"]!r}, {expansion["accumulated"]}'
+                              f'{", " + repr(expansion["reinterpreted_number"]) + ", " + repr(expansion["selectors"]) if source.number is None else ""})')
+
+        for method, return_type, value in [
+            ('numpy_dtype', 'np.dtype', f'np.dtype([{", ".join(dtype_columns)}])'),
+            ('field_base_types', 'Tuple[type]', MessageCodeGenerator._tuple_literal(base_types)),
+            ('field_scales', 'Tuple[float]', MessageCodeGenerator._tuple_literal([repr(scale) for scale in scales])),
+            ('field_offsets', 'Tuple[float]', MessageCodeGenerator._tuple_literal([repr(offset) for offset in offsets])),
+            ('field_units', 'Dict[str, Unit]', f'{{{", ".join(units)}}}'),
+            ('component_expansions', 'Tuple[ComponentExpansion]', MessageCodeGenerator._tuple_literal(expansions) if expansions else '()'),
+        ]:
+            cw.write('@staticmethod')
+            cw.write('@functools.lru_cache(1)')
+            cw.write(f'def {method}() -> {return_type}:')
+            cw.indent()
+            cw.write(f'return {value}')
             cw.unindent()
+            cw.new_line()
+
+    def _component_expansions(self, message) -> List[Dict]:
+        # Components of every component field, in field extraction order so that the destinations of components can be expanded in turn
+        fields_by_name = message.fields_by_name
+        expansions = []
+        for i in MessageCodeGenerator._field_extraction_order(message.fields):
+            source = message.fields[i]
+            if not isinstance(source, MessageComponentFieldProfile):
+                continue
+
+            bit_offset = 0
+            for component in source.components:
+                destination = fields_by_name.get(component.destination_field)
+                if destination is None:
+                    raise CodeGeneratorError(f'Component {component.destination_field} of field {source.name} of message {message.name} is not a field of the message')
+                if component.bits is None:
+                    raise CodeGeneratorError(f'Component {component.destination_field} of field {source.name} of message {message.name} has no bits')
+
+                reinterpreted_number = None
+                selectors = ()
+                if source.number is None:
+                    reinterpreted_field = MessageCodeGenerator._reinterpreted_field(message.fields, i)
+                    reinterpreted_number = reinterpreted_field.number if reinterpreted_field is not None else None
+                    selectors = tuple([self._selector(message, source, matcher) for matcher in source.dynamic_field_matchers])
+
+                bits = int(component.bits)
+                scale = MessageCodeGenerator._scalar_number(component.scale, 1, message.name, source.name)
+                offset = MessageCodeGenerator._scalar_number(component.offset, 0, message.name, source.name)
+                destination_scale, destination_offset, _ = MessageCodeGenerator._field_scale_offset_units(message.name, destination)
+                expansions.append({
+                    'source': source,
+                    'destination': destination,
+                    'bit_offset': bit_offset,
+                    'bits': bits,
+                    'factor': destination_scale / scale,
+                    'shift': (destination_offset - offset) * destination_scale,
+                    'accumulated': bool(component.accumulated),
+                    'reinterpreted_number': reinterpreted_number,
+                    'selectors': selectors,
+                })
+                bit_offset = bit_offset + bits
+
+        return expansions
+
+    @staticmethod
+    def _reinterpreted_field(fields, i: int):
+        # Dynamic fields reinterpret the closest field with a field number before them
+        for j in range(i, 0, -1):
+            if fields[j].number is not None:
+                return fields[j]
+        return None
+
+    def _selector(self, message, field, matcher) -> Tuple[int, int]:
+        # Field number and raw value of the reference field of a dynamic field matcher, enum values are given by name in the profile
+        reference_field = message.fields_by_name[matcher.ref_field_name]
+        value = matcher.ref_field_value
+        if reference_field.type not in BASE_TYPE_NAME_MAP and isinstance(value, str):
+            type_profile = self.profile.types_by_name.get(reference_field.type)
+            named_values = [named_value for named_value in type_profile.values if named_value.name == value] if type_profile is not None else []
+            if not named_values:
+                raise CodeGeneratorError(f'Dynamic field {field.name} of message {message.name} references unknown value {value} of field {reference_field.name}')
+            value = named_values[0].value
+
+        return reference_field.number, int(value, 0) if isinstance(value, str) else int(value)
+
+    def _cast_type_name(self, field_type: str) -> str:
+        if field_type in BASE_TYPE_NAME_MAP:
+            return f'FIT.base_types.{CodeGenerator._capitalize_type_name(BASE_TYPE_NAME_MAP[field_type])}'
+        return f'FIT.types.{CodeGenerator._capitalize_type_name(field_type)}'
+
+    @staticmethod
+    def _field_scale_offset_units(message_name: str, field) -> Tuple[float, float, Optional[str]]:
+        # Component fields with a single component, like speed and enhanced_speed, share the scale, offset and units of their component
+        if isinstance(field, MessageScalarFieldProfile):
+            return MessageCodeGenerator._scalar_number(field.scale, 1, message_name, field.name), MessageCodeGenerator._scalar_number(field.offset, 0, message_name, field.name), field.units
+        if len(field.components) == 1:
+            component = field.components[0]
+            return MessageCodeGenerator._scalar_number(component.scale, 1, message_name, field.name), MessageCodeGenerator._scalar_number(component.offset, 0, message_name, field.name), component.units
+        return 1.0, 0.0, None
+
+    def _base_type(self, field_type: str) -> str:
+        if field_type in BASE_TYPE_NAME_MAP:
+            return field_type
+
+        if field_type in self.profile.types_by_name:
+            return self.profile.types_by_name[field_type].base_type
+
+        raise CodeGeneratorError(f'Unable to find type {field_type}')
+
+    @staticmethod
+    def _fixed_array_length(array: Optional[str]) -> Optional[int]:
+        if array is None or not array.startswith('[') or not array.endswith(']') or not array[1:-1].isdigit():
+            return None
+        return int(array[1:-1])
+
+    @staticmethod
+    def _scalar_number(value, default: float, message_name: str, field_name: str) -> float:
+        # The profile can repeat the same value for every element of an array field, as a comma separated list
+        if value is None:
+            return float(default)
+        if isinstance(value, str):
+            values = {float(v) for v in value.split(',')}
+            if len(values) != 1:
+                raise CodeGeneratorError(f'Field {field_name} of message {message_name} has different scales or offsets per element: {value}')
+            return values.pop()
+        return float(value)
+
+    @staticmethod
+    def _tuple_literal(values: List[str]) -> str:
+        if len(values) == 1:
+            return f'({values[0]},)'
+        return f'({", ".join(values)})'
+
+    @staticmethod
+    def _field_numbers(fields) -> Dict[str, Tuple[int]]:
+        # Field numbers each field is decoded from, dynamic fields depend on the field they reinterpret and on the fields they reference
+        field_name_to_number_map = {field.name: field.number for field in fields}
+        field_numbers = {}
+        for i in range(0, len(fields)):
+            field = fields[i]
+            if field.number is not None:
+                field_numbers[field.name] = (field.number,)
+            else:
+                numbers = []
+                for j in range(i, 0, -1):
+                    if fields[j].number is not None:
+                        numbers.append(fields[j].number)
+                        break
+                for matcher in field.dynamic_field_matchers:
+                    ref_field_number = field_name_to_number_map.get(matcher.ref_field_name)
+                    if ref_field_number is not None and ref_field_number not in numbers:
+                        numbers.append(ref_field_number)
+                field_numbers[field.name] = tuple(numbers)
+
+        return field_numbers
 
     @staticmethod
     def _field_extraction_order(fields) -> List[int]:
-        dependencies = nx.nx.DiGraph()
+        dependencies = nx.DiGraph()
         field_name_to_index_map = {field.name: index for index, field in enumerate(fields)}
         dependencies.add_nodes_from(field_name_to_index_map.keys())
         for i in range(0, len(fields)):
@@ -2,22 +2,41 @@
 # See LICENSE for details
 
 
+import concurrent.futures
+import contextlib
+import functools
 import importlib
+import mmap
+import os
+import struct
 import warnings
-from typing import Dict, Union, Optional, Tuple, Any
+from dataclasses import dataclass
+from enum import Enum, auto
+from typing import Dict, Union, Optional, Tuple, Any, List, Iterator, Iterable, BinaryIO, FrozenSet
 import sys
 
-from FIT.base_types import UnsignedInt8, UnsignedInt16, UnsignedInt32, UnsignedInt64, BASE_TYPE_NUMBER_TO_CLASS
-from FIT.model import MessageDefinition, File, FileHeader, Record, NormalRecordHeader, CompressedTimestampRecordHeader, FieldDefinition, Architecture, RecordField, MessageContent, Message, UndocumentedMessage, ManufacturerSpecificMessage, \
-    UndocumentedMessageField, DeveloperMessageField
+from FIT.base_types import UnsignedInt8, UnsignedInt16, UnsignedInt32, UnsignedInt64, String, Byte, BASE_TYPE_NUMBER_TO_CLASS, NUMPY_TYPE_TO_STRUCT_FORMAT
+from FIT.model import MessageDefinition, File, FileHeader, Record, RecordHeader, NormalRecordHeader, CompressedTimestampRecordHeader, FieldDefinition, Architecture, RecordField, MessageContent, Message, UndocumentedMessage, ManufacturerSpecificMessage, \
+    UndocumentedMessageField, DeveloperMessageField, RecordLayout, MessageDispatchEntry, ComponentExpansion, DeveloperFieldDefinition, DeveloperFieldDescription
 
 import numpy as np
 
 
+# Global message numbers, as ints or MesgNum members, used to select which messages are decoded
+MessageSelection = Optional[Iterable[Union[int, Enum]]]
+
+# Fields to decode for some global message numbers, given by field name or field number, the fields of the messages not in it are all decoded
+FieldProjection = Optional[Dict[Union[int, Enum], Iterable[Union[str, int]]]]
+
+
 class FITFileContentError(Exception):
     pass
 
 
+class FITFileTruncatedError(FITFileContentError):
+    pass
+
+
 class FITFileContentWarning(Warning):
     pass
 
@@ -30,6 +49,109 @@ class FITGeneratedCodeNotFoundError(Exception):
     pass
 
 
+class DecodeMode(Enum):
+    # What Decoder.decode_many produces for each file
+    File = auto()
+    Messages = auto()
+    Columnar = auto()
+
+
+@dataclass(frozen=True)
+class DecodeResult:
+    # Outcome of decoding one of the files of Decoder.decode_many, index is the position of the file in the input
+    index: int
+    path: str
+    # File, tuple of messages or columns depending on the DecodeMode, None when decoding failed
+    value: Any
+    error: Optional[Exception]
+    # Warnings issued while decoding the file, such as FITFileContentWarning
+    warnings: Tuple[Warning, ...]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def release(self) -> None:
+        # Frees the shared memory blocks of the columns, when decoded with shared_memory
+        if isinstance(self.value, dict):
+            for column in self.value.values():
+                if isinstance(column, SharedArray):
+                    column.release()
+
+
+class SharedArray:
+    """
+    Handle to a NumPy array that a worker process wrote into a shared memory block, it only holds the block name, dtype and shape so it is cheap to pickle
+    array() maps the block and returns the array without copying it, release() frees the block, after which the arrays returned by array() must not be used
+    The creating process hands the block over, the process that unpickles the handle attaches the block and registers it with its resource tracker,
+    so blocks that are never released, for instance when the iteration of decode_many stops early, are unlinked with a warning when that process exits
+    """
+    def __init__(self, name: str, dtype: np.dtype, shape: Tuple[int, ...]):
+        self.name = name
+        self.dtype = dtype
+        self.shape = shape
+        self.shared_memory = None
+        self.released = False
+
+    @staticmethod
+    def create(array: np.ndarray) -> "SharedArray":
+        from multiprocessing import shared_memory, resource_tracker
+
+        # Zero sized blocks are not allowed
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        try:
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        except BaseException:
+            block.close()
+            block.unlink()
+            raise
+
+        # The block outlives the process that creates it, it is the receiving process that tracks it, see attach()
+        resource_tracker.unregister(block._name, 'shared_memory')
+        block.close()
+        return SharedArray(block.name, array.dtype, array.shape)
+
+    def attach(self) -> None:
+        # Attaching registers the block with the resource tracker of the current process, which unlinks it at exit unless it was released
+        if self.shared_memory is None:
+            from multiprocessing import shared_memory
+            self.shared_memory = shared_memory.SharedMemory(name=self.name)
+
+    def array(self) -> np.ndarray:
+        if self.released:
+            raise ValueError(f'Shared memory block {self.name} has already been released')
+
+        self.attach()
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self.shared_memory.buf)
+
+    def release(self) -> None:
+        if self.released:
+            return
+
+        self.attach()
+        block = self.shared_memory
+        self.shared_memory = None
+        self.released = True
+        block.unlink()
+        block.close()
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+    def __getstate__(self):
+        return self.name, self.dtype, self.shape, self.released
+
+    def __setstate__(self, state):
+        name, dtype, shape, released = state
+        self.__init__(name, dtype, shape)
+        self.released = released
+        if not released:
+            self.attach()
+
+
 class CRCCalculator:
     CRC_TABLE = [
         UnsignedInt16(0x0000),
@@ -50,62 +172,250 @@ class CRCCalculator:
         UnsignedInt16(0x4400),
     ]
 
-    x000F = UnsignedInt16(0x000F)
-    x0FFF = UnsignedInt16(0x0FFF)
+    # Number of bytes converted to words at a time by update, bounds the temporary memory used on large buffers
+    BLOCK_SIZE = 1 << 16
+
+    current: int
 
     def __init__(self):
-        self.current = UnsignedInt16(0)
+        self.current = 0
 
     def reset(self) -> None:
-        self.current = UnsignedInt16(0)
+        self.current = 0
 
     def new_byte(self, byte) -> None:
+        self.current = (self.current >> 8) ^ CRCCalculator.byte_table()[(self.current ^ int(byte)) & 0xFF]
+
+    def update(self, data: Union[bytes, bytearray, memoryview]) -> int:
+        """
+        Adds a whole buffer to the CRC and returns the updated value
+        The bytes are consumed two at a time using the 16 bit word table, with a final table lookup for an odd trailing byte
+        """
+        data = memoryview(data).cast('B')
+        word_table = CRCCalculator.word_table()
         crc = self.current
 
-        tmp = CRCCalculator.CRC_TABLE[crc & CRCCalculator.x000F]  # tmp = crc_table[crc & 0xF];
-        crc = (crc >> 4) & CRCCalculator.x0FFF  # crc = (crc >> 4) & 0x0FFF;
-        crc = crc ^ tmp ^ CRCCalculator.CRC_TABLE[byte & CRCCalculator.x000F]  # crc = crc ^ tmp ^ crc_table[byte & 0xF];
+        word_bytes = len(data) & ~1
+        for start in range(0, word_bytes, CRCCalculator.BLOCK_SIZE):
+            block = data[start:min(start + CRCCalculator.BLOCK_SIZE, word_bytes)]
+            for word in np.frombuffer(block, dtype='<u2').tolist():
+                crc = word_table[crc ^ word]
 
-        tmp = CRCCalculator.CRC_TABLE[crc & CRCCalculator.x000F]  # tmp = crc_table[crc & 0xF];
-        crc = (crc >> 4) & CRCCalculator.x0FFF  # crc = (crc >> 4) & 0x0FFF;
-        crc = crc ^ tmp ^ CRCCalculator.CRC_TABLE[(byte >> 4) & CRCCalculator.x000F]  # crc = crc ^ tmp ^ crc_table[(byte >> 4) & 0xF];
+        if len(data) & 1:
+            crc = (crc >> 8) ^ CRCCalculator.byte_table()[(crc ^ data[-1]) & 0xFF]
 
         self.current = crc
+        return crc
+
+    @staticmethod
+    def compute(data: Union[bytes, bytearray, memoryview]) -> int:
+        """
+        Computes the CRC of a buffer in a single call
+        """
+        crc_calculator = CRCCalculator()
+        return crc_calculator.update(data)
+
+    @staticmethod
+    @functools.lru_cache(1)
+    def byte_table() -> Tuple[int]:
+        """
+        256 entry table that processes a full byte per lookup, derived from the 4 bit CRC_TABLE used by the FIT SDK
+        """
+        table = []
+        for byte in range(0, 256):
+            crc = 0
+
+            tmp = int(CRCCalculator.CRC_TABLE[crc & 0xF])
+            crc = (crc >> 4) & 0x0FFF
+            crc = crc ^ tmp ^ int(CRCCalculator.CRC_TABLE[byte & 0xF])
+
+            tmp = int(CRCCalculator.CRC_TABLE[crc & 0xF])
+            crc = (crc >> 4) & 0x0FFF
+            crc = crc ^ tmp ^ int(CRCCalculator.CRC_TABLE[(byte >> 4) & 0xF])
+
+            table.append(crc)
+
+        return tuple(table)
+
+    @staticmethod
+    @functools.lru_cache(1)
+    def word_table() -> List[int]:
+        """
+        65536 entry table that processes two bytes (a little endian word XORed with the current CRC) per lookup
+        Since the CRC is 16 bits wide, the result of processing two bytes only depends on the XOR of the CRC and the word
+        """
+        byte_table = np.array(CRCCalculator.byte_table(), dtype=np.uint32)
+        words = np.arange(0, 1 << 16, dtype=np.uint32)
+        low = byte_table[words & 0xFF]
+        return ((low >> 8) ^ byte_table[((words >> 8) ^ low) & 0xFF]).tolist()
 
 
 class ByteReader:
+    DOUBLE_BYTE = struct.Struct('<H')
+    QUAD_BYTE = struct.Struct('<I')
+    OCTO_BYTE = struct.Struct('<Q')
+
     bytes_read: int
     crc_calculator: CRCCalculator
-    raw_bytes: Union[bytearray, bytes]
-
-    def __init__(self, raw_bytes: bytes):
+    crc_position: int
+    raw_bytes: memoryview
+    window_start: int
+
+    def __init__(self, raw_bytes: Union[bytes, bytearray, memoryview, mmap.mmap]):
+        """
+        Any object supporting the buffer protocol can be read, the bytes are accessed through a memoryview so they are never copied
+        """
         self.bytes_read = 0
-        self.raw_bytes = raw_bytes
+        self.raw_bytes = memoryview(raw_bytes).cast('B')
         self.crc_calculator = CRCCalculator()
+        self.crc_position = 0
 
-    def read_byte(self) -> UnsignedInt8:
-        if self.bytes_left() == 0:
-            raise FITFileContentError('Unexpected end of file encountered')
+        # Position in the file of the first byte of raw_bytes, it only changes for readers that hold a window of the file
+        self.window_start = 0
 
-        byte = UnsignedInt8(self.raw_bytes[self.bytes_read])
-        self.bytes_read = self.bytes_read + 1
-        self.crc_calculator.new_byte(byte)
-        return byte
+    def advance(self, count: int) -> int:
+        """
+        Moves the position forward by count bytes and returns the index in raw_bytes those bytes start at
+        """
+        count = int(count)
+        position = self.bytes_read - self.window_start
+        if len(self.raw_bytes) - position < count:
+            raise FITFileTruncatedError('Unexpected end of file encountered')
+
+        self.bytes_read = self.bytes_read + count
+        return position
+
+    def read_byte(self) -> UnsignedInt8:
+        position = self.advance(1)
+        return UnsignedInt8(self.raw_bytes[position])
 
     def read_double_byte(self) -> UnsignedInt16:
-        return UnsignedInt16(np.array([self.read_byte() for _ in range(0, 2)]).view(UnsignedInt16)[0])
+        position = self.advance(2)
+        return UnsignedInt16(ByteReader.DOUBLE_BYTE.unpack_from(self.raw_bytes, position)[0])
 
     def read_quad_byte(self) -> UnsignedInt32:
-        return UnsignedInt32(np.array([self.read_byte() for _ in range(0, 4)]).view(UnsignedInt32)[0])
+        position = self.advance(4)
+        return UnsignedInt32(ByteReader.QUAD_BYTE.unpack_from(self.raw_bytes, position)[0])
+
+    def read_octo_byte(self) -> UnsignedInt64:
+        position = self.advance(8)
+        return UnsignedInt64(ByteReader.OCTO_BYTE.unpack_from(self.raw_bytes, position)[0])
 
-    def read_octo_byte(self) -> UnsignedInt32:
-        return UnsignedInt64(np.array([self.read_byte() for _ in range(0, 8)]).view(UnsignedInt64)[0])
+    def unpack(self, record_struct: struct.Struct) -> Tuple[Any, ...]:
+        position = self.advance(record_struct.size)
+        return record_struct.unpack_from(self.raw_bytes, position)
 
-    def read_bytes(self, count: int) -> bytes:
-        return bytes([self.read_byte() for _ in range(0, count)])
+    def read_bytes(self, count: int) -> memoryview:
+        count = int(count)
+        position = self.advance(count)
+        return self.raw_bytes[position:position + count]
 
     def bytes_left(self):
-        return len(self.raw_bytes) - self.bytes_read
+        return len(self.raw_bytes) - (self.bytes_read - self.window_start)
+
+    def crc(self) -> int:
+        """
+        Returns the CRC of all the bytes read since the last reset, the pending range is added in a single update
+        """
+        self.crc_calculator.update(self.raw_bytes[self.crc_position - self.window_start:self.bytes_read - self.window_start])
+        self.crc_position = self.bytes_read
+        return self.crc_calculator.current
+
+    def reset_crc(self) -> None:
+        """
+        Starts a new CRC range at the current position
+        """
+        self.crc_calculator.reset()
+        self.crc_position = self.bytes_read
+
+    def release(self) -> None:
+        """
+        Releases the underlying buffer, the reader can no longer be used after this
+        """
+        try:
+            self.raw_bytes.release()
+        except BufferError:
+            # A slice of the buffer is still referenced, it will be released when garbage collected
+            pass
+
+    @staticmethod
+    @contextlib.contextmanager
+    def from_file(file_name: str) -> Iterator["ByteReader"]:
+        """
+        Memory maps a file and provides a ByteReader over it, the file is unmapped and closed on exit
+        """
+        with open(file_name, 'rb') as file:
+            try:
+                mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be memory mapped
+                mapped_file = None
+
+            reader = ByteReader(mapped_file if mapped_file is not None else b'')
+            try:
+                yield reader
+            finally:
+                reader.release()
+                if mapped_file is not None:
+                    try:
+                        mapped_file.close()
+                    except BufferError:
+                        # A slice of the mapped file is still referenced, it will be unmapped when garbage collected
+                        pass
+
+
+class StreamByteReader(ByteReader):
+    """
+    ByteReader over a binary file like object that is read incrementally
+    Only a window of the file is kept in memory, it grows up to the size of the largest read (a whole data record)
+    """
+    DEFAULT_CHUNK_SIZE = 1 << 16
+
+    chunk_size: int
+
+    def __init__(self, file: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(b'')
+        self.file = file
+        self.chunk_size = chunk_size
+
+    def advance(self, count: int) -> int:
+        count = int(count)
+        if len(self.raw_bytes) - (self.bytes_read - self.window_start) < count:
+            self.refill(count)
+
+        return super().advance(count)
+
+    def refill(self, count: int) -> None:
+        """
+        Drops the bytes already read from the window and reads from the file until at least count bytes are available
+        """
+        # The bytes about to be dropped are added to the CRC first
+        self.crc()
+
+        chunks = [bytes(self.raw_bytes[self.bytes_read - self.window_start:])]
+        available = len(chunks[0])
+        while available < count:
+            chunk = self.file.read(max(self.chunk_size, count - available))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            available = available + len(chunk)
+
+        self.raw_bytes = memoryview(b''.join(chunks))
+        self.window_start = self.bytes_read
+
+    @staticmethod
+    @contextlib.contextmanager
+    def from_source(source: Union[str, os.PathLike, BinaryIO], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[ByteReader]:
+        """
+        Provides a reader for either a file name, which is memory mapped, or a binary file like object, which is read in chunks
+        File like objects are not closed on exit
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with ByteReader.from_file(source) as reader:
+                yield reader
+        else:
+            yield StreamByteReader(source, chunk_size)
 
 
 class Decoder:
@@ -118,17 +428,83 @@ class Decoder:
     HAS_DEVELOPER_DATA_POSITION = 6 - 1
     RESERVED_BIT_POSITION = 5 - 1
 
+    TIMESTAMP_STRUCTS = {'<': struct.Struct('<I'), '>': struct.Struct('>I')}
+
+    # Indexed by whether the architecture is big endian
+    DEFINITION_GLOBAL_MESSAGE_NUMBER_STRUCTS = (struct.Struct('<H'), struct.Struct('>H'))
+
+    # Value of the fields left out by a projection
+    SKIPPED_FIELD = RecordField(None)
+    MISSING_FIELD = (RecordField(None),)
+
     reader: ByteReader
     most_recent_timestamp: Optional[UnsignedInt32]
 
     message_definitions: Dict[int, MessageDefinition]
 
-    def __init__(self, reader: ByteReader):
+    # Global message numbers to decode, None means all of them, and global message numbers to skip
+    include_messages: Optional[FrozenSet[int]]
+    exclude_messages: FrozenSet[int]
+
+    # Field numbers to decode by global message number
+    projection: Dict[int, FrozenSet[int]]
+
+    def __init__(self, reader: ByteReader, include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None):
+        """
+        Messages can be selected by global message number, either as ints or MesgNum members
+        Definitions and data records of the messages that are not selected are skipped without decoding their fields
+        The projection restricts the fields decoded for some messages, the bytes of the other fields are skipped and their value is None
+        """
         self.reader = reader
         self.message_definitions = {}
         self.most_recent_timestamp = None
+        self.include_messages = Decoder.message_numbers(include_messages) if include_messages is not None else None
+        self.exclude_messages = Decoder.message_numbers(exclude_messages) if exclude_messages is not None else frozenset()
+        self.projection = Decoder.resolve_projection(projection) if projection is not None else {}
+
+    @staticmethod
+    def message_numbers(messages: Iterable[Union[int, Enum]]) -> FrozenSet[int]:
+        return frozenset([int(message.value) if isinstance(message, Enum) else int(message) for message in messages])
+
+    @staticmethod
+    def resolve_projection(projection: FieldProjection) -> Dict[int, FrozenSet[int]]:
+        # Field names are looked up in the generated message classes, the timestamp is always decoded as compressed timestamps depend on it
+        resolved = {}
+        for message, projected_fields in projection.items():
+            global_message_number = int(message.value) if isinstance(message, Enum) else int(message)
+
+            field_numbers = {Decoder.TIMESTAMP_FIELD_NUMBER}
+            for projected_field in projected_fields:
+                if isinstance(projected_field, str):
+                    message_field_numbers = Decoder.message_class(global_message_number).field_numbers()
+                    if projected_field not in message_field_numbers:
+                        raise ValueError(f'Message {global_message_number} has no field named {projected_field}')
+                    field_numbers.update(message_field_numbers[projected_field])
+                else:
+                    field_numbers.add(int(projected_field))
+
+            resolved[global_message_number] = frozenset(field_numbers)
+
+        return resolved
+
+    @staticmethod
+    def message_class(global_message_number: int) -> type:
+        entry = MessageDecoder.dispatch_table().get(global_message_number)
+        if entry is None:
+            raise ValueError(f'Message {global_message_number} is not documented, its fields can only be given by number')
+
+        return entry.message_class
+
+    def is_selected(self, global_message_number: int) -> bool:
+        if global_message_number in self.exclude_messages:
+            return False
+
+        return self.include_messages is None or global_message_number in self.include_messages
 
     def decode_file(self) -> File:
+        # Both the header and the file CRC are computed from the start of the file
+        self.reader.reset_crc()
+
         header = self.decode_file_header()
         records = self.decode_records(header.data_size)
         crc = self.decode_crc(False)
@@ -140,7 +516,7 @@ class Decoder:
         protocol_version = self.reader.read_byte()
         profile_version = self.reader.read_double_byte()
         data_size = self.reader.read_quad_byte()
-        data_type = ''.join([chr(self.reader.read_byte()) for _ in range(0, 4)])
+        data_type = ''.join([chr(byte) for byte in self.reader.read_bytes(4)])
 
         if header_size not in [12, 14]:
             raise FITFileContentError(f'Invalid header size, Expected: 12 or 14, read: {header_size}')
@@ -156,29 +532,414 @@ class Decoder:
         return FileHeader(header_size, protocol_version, profile_version, data_size, data_type, crc)
 
     def decode_records(self, data_size: UnsignedInt32) -> Tuple[Record]:
+        return tuple(self.iterate_records(data_size))
+
+    def iterate_records(self, data_size: UnsignedInt32) -> Iterator[Record]:
         initial_bytes_read = self.reader.bytes_read
 
-        records = []
         while self.reader.bytes_read - initial_bytes_read < data_size:
-            records.append(self.decode_record())
+            record = self.decode_record()
+            if record is not None:
+                yield record
 
-        return tuple(records)
+    def decode_record(self) -> Optional[Record]:
+        # Returns None for the records of messages that are not selected
+        header = self.decode_record_header()
+
+        if header.is_definition_message:
+            content = self.decode_message_definition(header)
+            if not self.is_selected(content.global_message_number):
+                return None
+        else:
+            message_definition = self.message_definitions.get(header.local_message_type)
+            if message_definition is not None and not self.is_selected(message_definition.global_message_number):
+                self.skip_message_content(message_definition)
+                return None
+
+            content = self.decode_message_content(header)
 
-    def decode_record(self) -> Record:
+        return Record(header, content)
+
+    def decode_record_header(self) -> RecordHeader:
         header_byte = self.reader.read_byte()
         is_compressed_timestamp_header = Decoder.bit_get(header_byte, Decoder.IS_COMPRESSED_TIMESTAMP_HEADER_POSITION)
 
         if is_compressed_timestamp_header:
-            header = self.decode_compressed_timestamp_record_header(header_byte)
+            return self.decode_compressed_timestamp_record_header(header_byte)
         else:
-            header = self.decode_normal_record_header(header_byte)
+            return self.decode_normal_record_header(header_byte)
 
-        if header.is_definition_message:
-            content = self.decode_message_definition(header)
+    def decode_file_columnar(self) -> Dict[int, np.ndarray]:
+        """
+        Decodes the file into one structured array per global message number, with one column per field number
+        The data records are not decoded one by one, their bytes are gathered per definition and viewed through the definition dtype
+        """
+        self.reader.reset_crc()
+
+        header = self.decode_file_header()
+
+        # Timestamps known before the first record, and from skipped records, as (record index, timestamp)
+        timestamp_events = [(-1, int(self.most_recent_timestamp))] if self.most_recent_timestamp is not None else []
+
+        # Position in the file and time offset of the records with compressed timestamp headers and no timestamp field
+        compressed_indices = []
+        time_offsets = []
+
+        # Each definition record starts a new segment that collects the bytes and the position in the file of its data records
+        segments = []
+        current_segments = {}
+        record_index = 0
+        initial_bytes_read = self.reader.bytes_read
+        while self.reader.bytes_read - initial_bytes_read < header.data_size:
+            record_header = self.decode_record_header()
+
+            if record_header.is_definition_message:
+                definition = self.decode_message_definition(record_header)
+                segment = (definition, [], [])
+                segments.append(segment)
+                current_segments[record_header.local_message_type] = segment
+            else:
+                segment = current_segments.get(record_header.local_message_type)
+                if segment is None:
+                    raise FITFileContentError(f'Unable to find local message type definition {record_header.local_message_type}')
+
+                definition, record_bytes, record_indices = segment
+                if not record_header.is_normal_header and definition.layout.timestamp_offset is None:
+                    compressed_indices.append(record_index)
+                    time_offsets.append(record_header.time_offset)
+
+                if self.is_selected(definition.global_message_number):
+                    record_bytes.append(self.reader.read_bytes(definition.layout.size))
+                    record_indices.append(record_index)
+                else:
+                    self.skip_message_content(definition)
+                    if definition.layout.timestamp_offset is not None:
+                        timestamp_events.append((record_index, int(self.most_recent_timestamp)))
+
+            record_index = record_index + 1
+
+        self.decode_crc(False)
+
+        # Views the bytes of each segment as an array and groups the segments by global message number
+        grouped_segments = {}
+        timestamp_indices = [np.array([index for index, _ in timestamp_events], dtype=np.int64)]
+        timestamps = [np.array([timestamp for _, timestamp in timestamp_events], dtype=np.int64)]
+        for definition, record_bytes, record_indices in segments:
+            if record_bytes:
+                array = np.frombuffer(b''.join(record_bytes), dtype=definition.layout.record_dtype)
+                grouped_segments.setdefault(int(definition.global_message_number), []).append((definition.layout, array, record_indices))
+
+                if definition.layout.timestamp_offset is not None:
+                    timestamp_indices.append(np.array(record_indices, dtype=np.int64))
+                    timestamps.append(array[str(Decoder.TIMESTAMP_FIELD_NUMBER)].astype(np.int64))
+
+        columns = {global_message_number: Decoder.merge_columns(grouped) for global_message_number, grouped in grouped_segments.items()}
+
+        if compressed_indices:
+            compressed_indices = np.array(compressed_indices, dtype=np.int64)
+            resolved = Decoder.resolve_compressed_timestamps(np.concatenate(timestamp_indices), np.concatenate(timestamps), compressed_indices, np.array(time_offsets, dtype=np.int64))
+
+            # The resolved timestamps are written to the timestamp column of their messages, which is added if needed
+            timestamp_column = str(Decoder.TIMESTAMP_FIELD_NUMBER)
+            for global_message_number, grouped in grouped_segments.items():
+                record_indices = np.sort(np.concatenate([np.array(indices, dtype=np.int64) for _, _, indices in grouped]))
+                is_in_message = np.isin(compressed_indices, record_indices)
+                if not is_in_message.any():
+                    continue
+
+                merged = columns[global_message_number]
+                if timestamp_column not in merged.dtype.names:
+                    merged = Decoder.add_column(merged, timestamp_column, np.dtype(np.uint32), Decoder.invalid_value(UnsignedInt32, np.dtype(np.uint32)))
+                    columns[global_message_number] = merged
+
+                merged[timestamp_column][np.searchsorted(record_indices, compressed_indices[is_in_message])] = resolved[is_in_message]
+
+        return columns
+
+    @staticmethod
+    def resolve_compressed_timestamps(timestamp_indices: np.ndarray, timestamps: np.ndarray, compressed_indices: np.ndarray, time_offsets: np.ndarray) -> np.ndarray:
+        """
+        Resolves all the compressed timestamps of a file at once, given the record index of every timestamp field and of every compressed timestamp header
+        Each compressed timestamp moves forward from the previous timestamp by the difference of their 5 least significant bits, with rollover,
+        so the timestamps are a cumulative sum of those differences restarted at every timestamp field
+        Returns the timestamps in the order of compressed_indices, with the invalid value for the ones not preceded by any valid timestamp
+        """
+        # Compressed timestamps go first so that, on the same record, the timestamp field wins
+        indices = np.concatenate([compressed_indices, timestamp_indices])
+        order = np.argsort(indices, kind='stable')
+        is_timestamp = np.concatenate([np.zeros(len(compressed_indices), dtype=bool), np.ones(len(timestamp_indices), dtype=bool)])[order]
+        values = np.concatenate([time_offsets, timestamps]).astype(np.int64)[order]
+
+        low_bits = values & 0x1F
+        deltas = np.empty_like(values)
+        deltas[0] = values[0]
+        deltas[1:] = (low_bits[1:] - low_bits[:-1]) & 0x1F
+        deltas[is_timestamp] = values[is_timestamp]
+
+        sums = np.cumsum(deltas)
+        groups = np.cumsum(is_timestamp)
+        group_starts = np.concatenate([[0], (sums - deltas)[is_timestamp]])
+        resolved = (sums - group_starts[groups]) & 0xFFFFFFFF
+
+        # Group 0 has no timestamp before it, and an invalid timestamp field is no reference for the compressed timestamps that follow it
+        invalid_timestamp = Decoder.invalid_value(UnsignedInt32, np.dtype(np.int64))
+        invalid_groups = np.concatenate([[True], values[is_timestamp] == invalid_timestamp])
+        resolved[invalid_groups[groups]] = invalid_timestamp
+
+        return resolved[~is_timestamp].astype(np.uint32)
+
+    @staticmethod
+    def add_column(array: np.ndarray, name: str, dtype: np.dtype, fill_value) -> np.ndarray:
+        extended = np.empty(len(array), dtype=[(column, array.dtype.fields[column][0]) for column in array.dtype.names] + [(name, dtype)])
+        for column in array.dtype.names:
+            extended[column] = array[column]
+        extended[name] = fill_value
+        return extended
+
+    @staticmethod
+    def merge_columns(segments: List[Tuple[RecordLayout, np.ndarray, List[int]]]) -> np.ndarray:
+        """
+        Merges the arrays of all the segments of a global message number into a single native byte order array in file order
+        Columns missing from a segment, or array columns shorter than in other segments, are filled with the base type invalid value
+        """
+        column_dtypes = {}
+        column_types = {}
+        for layout, array, _ in segments:
+            for name, type_class in zip(array.dtype.names, layout.column_types):
+                column_dtype = array.dtype.fields[name][0]
+                base_dtype = column_dtype.base.newbyteorder('=') if column_dtype.base.kind != 'S' else column_dtype.base
+                shape = column_dtype.shape
+
+                if name not in column_dtypes:
+                    column_dtypes[name] = (base_dtype, shape)
+                    column_types[name] = type_class
+                    continue
+
+                merged_dtype, merged_shape = column_dtypes[name]
+                if (merged_dtype.kind == 'S') != (base_dtype.kind == 'S'):
+                    raise FITFileContentError(f'Field number {name} is defined both as a string and as a number')
+
+                if merged_dtype.kind == 'S':
+                    merged_dtype = merged_dtype if merged_dtype.itemsize >= base_dtype.itemsize else base_dtype
+                else:
+                    merged_dtype = np.promote_types(merged_dtype, base_dtype)
+
+                column_dtypes[name] = (merged_dtype, max(merged_shape, shape))
+
+        merged = np.empty(sum([len(array) for _, array, _ in segments]), dtype=[(name, dtype, shape) for name, (dtype, shape) in column_dtypes.items()])
+        for name in merged.dtype.names:
+            merged[name] = Decoder.invalid_value(column_types[name], merged.dtype.fields[name][0].base)
+
+        start = 0
+        for _, array, _ in segments:
+            rows = merged[start:start + len(array)]
+            for name in array.dtype.names:
+                column = array[name]
+                if column.ndim == 1 and rows[name].ndim > 1:
+                    # A scalar field redefined as an array, the scalar is the first element and the others are left invalid
+                    rows[name][:, 0] = column
+                elif column.ndim > 1 and column.shape[1:] != rows[name].shape[1:]:
+                    rows[name][:, :column.shape[1]] = column
+                else:
+                    rows[name] = column
+            start = start + len(array)
+
+        # The records of a global message number can be spread over several interleaved segments, they are put back in file order
+        if len(segments) > 1:
+            record_indices = np.concatenate([np.array(indices, dtype=np.int64) for _, _, indices in segments])
+            merged = merged[np.argsort(record_indices, kind='stable')]
+
+        return merged
+
+    @staticmethod
+    def invalid_value(type_class: type, dtype: np.dtype):
+        metadata = type_class.metadata()
+
+        if dtype.kind == 'S':
+            return b''
+
+        if dtype.kind == 'f':
+            # The invalid value of the floating point types is given as a bit pattern
+            return np.array(metadata.invalid_value, dtype=f'u{metadata.underlying_bytes}').view(metadata.numpy_type).astype(dtype)
+
+        return np.array(metadata.invalid_value).astype(dtype)
+
+    @staticmethod
+    def convert_columns(columns: np.ndarray, message_class: type) -> np.ndarray:
+        """
+        Converts the columns of a message, as returned by decode_file_columnar, to physical units using the tables of the generated message class
+        The result has one column per field of the message present in columns, named after the field instead of the field number
+        Fields with a scale or an offset are converted at once as value / scale - offset into float64 columns with NaN for the invalid values,
+        the rest are kept as decoded
+        """
+        dtype = message_class.numpy_dtype()
+        field_numbers = message_class.field_numbers()
+
+        names = []
+        numbers = []
+        for name in dtype.names:
+            column_name = str(field_numbers[name][0])
+            if column_name in columns.dtype.names:
+                names.append(name)
+                numbers.append(column_name)
+
+        positions = [dtype.names.index(name) for name in names]
+        scales = np.array(message_class.field_scales())[positions]
+        offsets = np.array(message_class.field_offsets())[positions]
+        base_types = [message_class.field_base_types()[position] for position in positions]
+        is_scaled = (scales != 1) | (offsets != 0)
+
+        converted = np.empty(len(columns), dtype=[(name, np.float64 if scaled else columns.dtype.fields[number][0].base, columns.dtype.fields[number][0].shape) for name, number, scaled in zip(names, numbers, is_scaled)])
+        for name, number, scaled, scale, offset, base_type in zip(names, numbers, is_scaled, scales, offsets, base_types):
+            column = columns[number]
+            if scaled:
+                values = column / scale - offset
+                values[column == Decoder.invalid_value(base_type, column.dtype)] = np.nan
+                converted[name] = values
+            else:
+                converted[name] = column
+
+        return converted
+
+    @staticmethod
+    def expand_component(value, expansion: ComponentExpansion):
+        """
+        Unpacks the component of a single field value, returns the raw value of the destination field or None if the source value is invalid
+        """
+        component = Decoder.component_bits(value, expansion)
+        return None if component is None else Decoder.scale_component(component, expansion)
+
+    @staticmethod
+    def component_bits(value, expansion: ComponentExpansion) -> Optional[int]:
+        if value is None:
+            return None
+        if isinstance(value, Enum):
+            value = value.value
+
+        invalid_value = expansion.source_type.metadata().invalid_value
+        if isinstance(value, tuple):
+            if all([element == invalid_value for element in value]):
+                return None
+            raw_value = 0
+            for i, element in enumerate(value):
+                raw_value = raw_value | (int(element) << (expansion.element_bits * i))
         else:
-            content = self.decode_message_content(header)
+            if value == invalid_value:
+                return None
+            raw_value = int(value)
 
-        return Record(header, content)
+        return (raw_value >> expansion.bit_offset) & expansion.mask
+
+    @staticmethod
+    def accumulate_component(value, destination_value, expansion: ComponentExpansion, message_class: type, accumulator: "Accumulator"):
+        """
+        Accumulated counterpart of expand_component, returns the raw value of the destination field
+        A destination value present in the message is kept and restarts the accumulation, otherwise the component is added to the running total
+        """
+        key = (message_class, expansion.destination_name)
+        if destination_value is not None:
+            raw_destination_value = destination_value.value if isinstance(destination_value, Enum) else destination_value
+            if raw_destination_value != expansion.destination_type.metadata().invalid_value:
+                accumulator.set(key, Decoder.unscale_component(int(raw_destination_value), expansion))
+                return destination_value
+
+        component = Decoder.component_bits(value, expansion)
+        if component is None:
+            return destination_value
+
+        return Decoder.scale_component(accumulator.accumulate_value(key, component, expansion.bits), expansion)
+
+    @staticmethod
+    def unscale_component(value: int, expansion: ComponentExpansion) -> int:
+        # Inverse of scale_component, from the destination field to the component units
+        if expansion.factor == 1 and expansion.shift == 0:
+            return value
+        return int(round((value - expansion.shift) / expansion.factor))
+
+    @staticmethod
+    def scale_component(component, expansion: ComponentExpansion):
+        # Works both on single values and on arrays
+        if expansion.factor == 1 and expansion.shift == 0:
+            return component
+
+        value = component * expansion.factor + expansion.shift
+        if not expansion.is_integer:
+            return value
+        return np.rint(value).astype(np.int64) if isinstance(value, np.ndarray) else int(round(value))
+
+    @staticmethod
+    def unpack_component_bits(column: np.ndarray, expansion: ComponentExpansion) -> np.ndarray:
+        """
+        Extracts the bits of a component from a whole column with shifts and masks, array columns are read as a single little endian value per row
+        Only the elements that hold bits of the component are combined, so components of long arrays do not overflow 64 bits
+        """
+        if column.ndim == 1:
+            return (column.astype(np.uint64) >> np.uint64(expansion.bit_offset)) & np.uint64(expansion.mask)
+
+        first = expansion.bit_offset // expansion.element_bits
+        last = min((expansion.bit_offset + expansion.bits - 1) // expansion.element_bits, column.shape[1] - 1)
+        combined = np.zeros(len(column), dtype=np.uint64)
+        for i in range(first, last + 1):
+            combined = combined | (column[:, i].astype(np.uint64) << np.uint64(expansion.element_bits * (i - first)))
+
+        return (combined >> np.uint64(expansion.bit_offset - first * expansion.element_bits)) & np.uint64(expansion.mask)
+
+    @staticmethod
+    def expand_components(columns: np.ndarray, message_class: type, accumulator: Optional["Accumulator"] = None) -> np.ndarray:
+        """
+        Expands the component fields of a message, as returned by decode_file_columnar, into their destination columns using the generated tables
+        Whole columns are unpacked at once, the expansions run in field extraction order so components of components are expanded too
+        Destination columns are added when missing and only their invalid values are replaced
+        Components of dynamic fields are unpacked from the field they reinterpret, in the rows where one of their reference fields selects them
+        Accumulated components are only expanded when an accumulator is given, pass the same one to consecutive batches of a file
+        """
+        expanded = columns.copy()
+        dtype = message_class.numpy_dtype()
+        for expansion in message_class.component_expansions():
+            source_number = expansion.source_number if expansion.source_number is not None else expansion.reinterpreted_number
+            source_name = str(source_number)
+            destination_name = str(expansion.destination_number)
+            if (expansion.accumulated and accumulator is None) or source_number is None or expansion.destination_number is None or source_name not in expanded.dtype.names:
+                continue
+
+            source = expanded[source_name]
+            if source.dtype.kind not in 'ui':
+                continue
+
+            if destination_name not in expanded.dtype.names:
+                destination_dtype = dtype.fields[expansion.destination_name][0].base
+                expanded = Decoder.add_column(expanded, destination_name, destination_dtype, Decoder.invalid_value(expansion.destination_type, destination_dtype))
+
+            destination = expanded[destination_name]
+            if destination.ndim > 1:
+                continue
+
+            is_valid = source != Decoder.invalid_value(expansion.source_type, source.dtype)
+            if source.ndim > 1:
+                is_valid = is_valid.any(axis=1)
+
+            if expansion.source_number is None:
+                is_selected = np.zeros(len(expanded), dtype=bool)
+                for reference_number, reference_value in expansion.selectors:
+                    if str(reference_number) in expanded.dtype.names:
+                        is_selected = is_selected | (expanded[str(reference_number)] == reference_value)
+                is_valid = is_valid & is_selected
+
+            is_present = destination != Decoder.invalid_value(expansion.destination_type, destination.dtype)
+            is_replaced = is_valid & ~is_present
+            if not expansion.accumulated:
+                destination[is_replaced] = Decoder.scale_component(Decoder.unpack_component_bits(source[is_replaced], expansion), expansion)
+                continue
+
+            # Components and destination values present in the messages are accumulated together in file order, the latter restart the total
+            is_used = is_replaced | is_present
+            components = np.zeros(len(expanded), dtype=np.int64)
+            components[is_replaced] = Decoder.unpack_component_bits(source[is_replaced], expansion).astype(np.int64)
+            components[is_present] = np.rint((destination[is_present].astype(np.float64) - expansion.shift) / expansion.factor).astype(np.int64)
+            accumulated = accumulator.accumulate((message_class, expansion.destination_name), components[is_used], expansion.bits, is_present[is_used])
+            destination[is_replaced] = Decoder.scale_component(accumulated[is_replaced[is_used]], expansion)
+
+        return expanded
 
     def decode_normal_record_header(self, header: UnsignedInt8) -> NormalRecordHeader:
         is_definition_message = Decoder.bit_get(header, Decoder.IS_DEFINITION_MESSAGE_POSITION)
@@ -195,7 +956,23 @@ class Decoder:
     def decode_compressed_timestamp_record_header(self, header_byte: UnsignedInt8) -> CompressedTimestampRecordHeader:
         local_message_type = (header_byte >> 5) & 0x3  # 5th to 7th bits
         time_offset = header_byte & 0x1F  # 1st to 4th bits
-        return CompressedTimestampRecordHeader(False, False, False, local_message_type, time_offset, self.most_recent_timestamp)
+
+        previous_timestamp = self.most_recent_timestamp
+        timestamp = None
+        if previous_timestamp is not None:
+            timestamp = Decoder.resolve_compressed_timestamp(previous_timestamp, time_offset)
+            self.most_recent_timestamp = timestamp
+
+        return CompressedTimestampRecordHeader(False, False, False, local_message_type, time_offset, previous_timestamp, timestamp)
+
+    @staticmethod
+    def resolve_compressed_timestamp(previous_timestamp: UnsignedInt32, time_offset: UnsignedInt8) -> UnsignedInt32:
+        # The offset holds the 5 least significant bits of the timestamp, a smaller offset than the previous one means they rolled over
+        # An invalid previous timestamp is no reference, so the compressed timestamp is invalid too
+        previous_timestamp = int(previous_timestamp)
+        if previous_timestamp == UnsignedInt32.metadata().invalid_value:
+            return UnsignedInt32(previous_timestamp)
+        return UnsignedInt32((previous_timestamp + ((int(time_offset) - previous_timestamp) & 0x1F)) & 0xFFFFFFFF)
 
     def decode_field_definition(self) -> FieldDefinition:
         number = self.reader.read_byte()
@@ -210,42 +987,57 @@ class Decoder:
 
         return FieldDefinition(number, size, endian_ability, base_type)
 
+    def decode_developer_field_definition(self) -> DeveloperFieldDefinition:
+        number = self.reader.read_byte()
+        size = self.reader.read_byte()
+        developer_data_index = self.reader.read_byte()
+        return DeveloperFieldDefinition(number, size, developer_data_index)
+
     def decode_message_definition(self, header: NormalRecordHeader) -> MessageDefinition:
-        reserved_byte = self.reader.read_byte()
+        # The raw bytes of the definition are read first, they are the key of the process wide definition cache
+        fixed_bytes = bytes(self.reader.read_bytes(5))
+        raw_definition = fixed_bytes + bytes(self.reader.read_bytes(3 * fixed_bytes[4]))
+        if header.has_developer_data:
+            number_of_developer_fields = self.reader.read_byte()
+            raw_definition = raw_definition + bytes([number_of_developer_fields]) + bytes(self.reader.read_bytes(3 * number_of_developer_fields))
+
+        global_message_number = Decoder.DEFINITION_GLOBAL_MESSAGE_NUMBER_STRUCTS[fixed_bytes[1] != 0].unpack_from(fixed_bytes, 2)[0]
+
+        definition = DEFINITION_CACHE.get(raw_definition, self.projection.get(global_message_number))
+        self.message_definitions[header.local_message_type] = definition
+        return definition
+
+    @staticmethod
+    def parse_message_definition(raw_definition: bytes, projected_fields: Optional[FrozenSet[int]] = None) -> MessageDefinition:
+        # Builds a definition, with its layout, from the bytes of a definition record that follow the record header
+        decoder = Decoder(ByteReader(raw_definition))
+        reserved_byte = decoder.reader.read_byte()
 
         if reserved_byte:
             raise FITFileContentError('Reserved byte after record header is not 0')
 
-        architecture = Architecture(self.reader.read_byte())
-        global_message_number = UnsignedInt16.from_bytes(self.reader.read_bytes(2))
+        architecture = Architecture(decoder.reader.read_byte())
+        global_message_number = UnsignedInt16.from_bytes(decoder.reader.read_bytes(2), architecture.byte_order)
 
-        number_of_fields = self.reader.read_byte()
-        field_definitions = tuple([self.decode_field_definition() for _ in range(0, number_of_fields)])
+        number_of_fields = decoder.reader.read_byte()
+        field_definitions = tuple([decoder.decode_field_definition() for _ in range(0, number_of_fields)])
 
-        number_of_developer_fields = self.reader.read_byte() if header.has_developer_data else 0
-        developer_field_definitions = tuple([self.decode_field_definition() for _ in range(0, number_of_developer_fields)])
+        # The developer fields count is only present when the record header has the developer data bit set
+        number_of_developer_fields = decoder.reader.read_byte() if decoder.reader.bytes_left() > 0 else 0
+        developer_field_definitions = tuple([decoder.decode_developer_field_definition() for _ in range(0, number_of_developer_fields)])
 
-        definition = MessageDefinition(reserved_byte, architecture, global_message_number, field_definitions, developer_field_definitions)
-        self.message_definitions[header.local_message_type] = definition
-        return definition
+        layout = Decoder.compile_record_layout(architecture, field_definitions, developer_field_definitions, projected_fields)
+        return MessageDefinition(reserved_byte, architecture, global_message_number, field_definitions, developer_field_definitions, layout)
 
-    def decode_field(self, field_definition: FieldDefinition) -> RecordField:
-        raw_bytes = self.reader.read_bytes(field_definition.size)  # TODO endianness
+    def decode_field(self, field_definition: FieldDefinition, architecture: Architecture = Architecture.LittleEndian) -> RecordField:
+        raw_bytes = self.reader.read_bytes(field_definition.size)
 
         type_class = BASE_TYPE_NUMBER_TO_CLASS[field_definition.base_type]
-        decoded_value = type_class.from_bytes(raw_bytes)
+        decoded_value = type_class.from_bytes(raw_bytes, architecture.byte_order)
 
-        if field_definition.number == Decoder.MESSAGE_INDEX_FIELD_NUMBER:
-            if field_definition.base_type != UnsignedInt16.metadata().base_type_number:
-                raise FITFileContentError('Message Index field number {} is expected to be of type {}, {} found', Decoder.MESSAGE_INDEX_FIELD_NUMBER, UnsignedInt16.__name__, type_class.__name__)
-
-        if field_definition.number == Decoder.PART_INDEX_FIELD_NUMBER:
-            if field_definition.base_type != UnsignedInt32.metadata().base_type_number:
-                raise FITFileContentError('Part Index field number {} is expected to be of type {}, {} found', Decoder.MESSAGE_INDEX_FIELD_NUMBER, UnsignedInt32.__name__, type_class.__name__)
+        Decoder.check_field_definition(field_definition, type_class)
 
         if field_definition.number == Decoder.TIMESTAMP_FIELD_NUMBER:
-            if field_definition.base_type != UnsignedInt32.metadata().base_type_number:
-                raise FITFileContentError('Timestamp field number {} is expected to be of type {}, {} found', Decoder.TIMESTAMP_FIELD_NUMBER, UnsignedInt32.__name__, type_class.__name__)
             self.most_recent_timestamp = decoded_value
 
         return RecordField(decoded_value)
@@ -256,16 +1048,129 @@ class Decoder:
         if not message_definition:
             raise FITFileContentError(f'Unable to find local message type definition {header.local_message_type}')
 
-        fields = tuple([self.decode_field(field_definition) for field_definition in message_definition.field_definitions])
-        developer_fields = tuple([self.decode_field(developer_field_definition) for developer_field_definition in message_definition.developer_field_definitions])
-        return MessageContent(fields, developer_fields)
+        layout = message_definition.layout
+        if layout is None:
+            layout = Decoder.compile_record_layout(message_definition.architecture, message_definition.field_definitions, message_definition.developer_field_definitions)
+
+        # The whole data record is decoded by a single unpack, the layout then groups the values into fields
+        values = self.reader.unpack(layout.record_struct)
+        fields = tuple([(RecordField(type_class(values[start]) if is_scalar else tuple(values[start:stop])) if type_class is not None else Decoder.SKIPPED_FIELD) for type_class, start, stop, is_scalar in layout.fields])
+
+        if layout.timestamp_position is not None:
+            self.most_recent_timestamp = fields[layout.timestamp_position].value
+
+        return MessageContent(fields[:layout.number_of_fields], fields[layout.number_of_fields:])
+
+    def skip_message_content(self, message_definition: MessageDefinition) -> None:
+        # Moves past the data record, only its timestamp is read as compressed timestamps depend on it
+        layout = message_definition.layout
+        position = self.reader.advance(layout.size)
+
+        if layout.timestamp_offset is not None:
+            timestamp_struct = Decoder.TIMESTAMP_STRUCTS[layout.record_format[0]]
+            self.most_recent_timestamp = UnsignedInt32(timestamp_struct.unpack_from(self.reader.raw_bytes, position + layout.timestamp_offset)[0])
+
+    @staticmethod
+    def check_field_definition(field_definition: FieldDefinition, type_class: type) -> None:
+        if field_definition.number == Decoder.MESSAGE_INDEX_FIELD_NUMBER:
+            if field_definition.base_type != UnsignedInt16.metadata().base_type_number:
+                raise FITFileContentError(f'Message Index field number {Decoder.MESSAGE_INDEX_FIELD_NUMBER} is expected to be of type {UnsignedInt16.__name__}, {type_class.__name__} found')
+
+        if field_definition.number == Decoder.PART_INDEX_FIELD_NUMBER:
+            if field_definition.base_type != UnsignedInt32.metadata().base_type_number:
+                raise FITFileContentError(f'Part Index field number {Decoder.PART_INDEX_FIELD_NUMBER} is expected to be of type {UnsignedInt32.__name__}, {type_class.__name__} found')
+
+        if field_definition.number == Decoder.TIMESTAMP_FIELD_NUMBER:
+            if field_definition.base_type != UnsignedInt32.metadata().base_type_number:
+                raise FITFileContentError(f'Timestamp field number {Decoder.TIMESTAMP_FIELD_NUMBER} is expected to be of type {UnsignedInt32.__name__}, {type_class.__name__} found')
+
+    @staticmethod
+    def compile_record_layout(architecture: Architecture, field_definitions: Tuple[FieldDefinition], developer_field_definitions: Tuple[DeveloperFieldDefinition], projected_fields: Optional[FrozenSet[int]] = None) -> RecordLayout:
+        """
+        Builds the decoding plan of the data records of a message definition: a struct format that unpacks the whole record
+        and, for each field, the type and range of values it is made of. The field definitions are validated once here
+        Fields not in projected_fields, when given, are pad bytes in the format and have no type in the plan
+        """
+        record_format = architecture.byte_order
+        fields = []
+        value_count = 0
+        timestamp_position = None
+        timestamp_offset = None
+
+        # Structured dtype equivalent to the struct format, with one column per (non repeated) field number
+        dtype_fields = {}
+        column_types = []
+        offset = 0
+
+        for position, field_definition in enumerate(field_definitions):
+            type_class = BASE_TYPE_NUMBER_TO_CLASS.get(field_definition.base_type)
+            if type_class is None:
+                raise FITFileContentError(f'Field number {field_definition.number} has unknown base type {field_definition.base_type}')
+
+            Decoder.check_field_definition(field_definition, type_class)
+
+            if projected_fields is not None and field_definition.number not in projected_fields:
+                record_format = record_format + f'{field_definition.size}x'
+                fields.append((None, value_count, value_count, False))
+                offset = offset + field_definition.size
+                continue
+
+            metadata = type_class.metadata()
+            if type_class is String:
+                # Strings are unpacked as a single bytes value
+                record_format = record_format + f'{field_definition.size}s'
+                count = 1
+                is_scalar = True
+            else:
+                if field_definition.size % metadata.underlying_bytes != 0:
+                    raise FITFileContentError(f'Field number {field_definition.number} of type {type_class.__name__} has size {field_definition.size}, expected a multiple of {metadata.underlying_bytes}')
+                count = field_definition.size // metadata.underlying_bytes
+                record_format = record_format + f'{count}{NUMPY_TYPE_TO_STRUCT_FORMAT[metadata.numpy_type]}'
+                is_scalar = count == 1
+
+            if field_definition.number == Decoder.TIMESTAMP_FIELD_NUMBER and is_scalar:
+                timestamp_position = position
+                timestamp_offset = offset
+
+            column_name = str(field_definition.number)
+            if column_name not in dtype_fields and count > 0:
+                if type_class is String:
+                    column_dtype = np.dtype(f'S{field_definition.size}')
+                else:
+                    column_dtype = np.dtype(metadata.numpy_type).newbyteorder(record_format[0])
+                    if not is_scalar:
+                        column_dtype = np.dtype((column_dtype, (count,)))
+                dtype_fields[column_name] = (column_dtype, offset)
+                column_types.append(type_class)
+
+            fields.append((type_class, value_count, value_count + count, is_scalar))
+            value_count = value_count + count
+            offset = offset + field_definition.size
+
+        # Developer fields are kept as raw bytes, their type is only known through the corresponding field description message
+        for developer_field_definition in developer_field_definitions:
+            if projected_fields is not None:
+                record_format = record_format + f'{developer_field_definition.size}x'
+                fields.append((None, value_count, value_count, False))
+                continue
+
+            record_format = record_format + f'{developer_field_definition.size}B'
+            fields.append((Byte, value_count, value_count + developer_field_definition.size, developer_field_definition.size == 1))
+            value_count = value_count + developer_field_definition.size
+
+        record_dtype = np.dtype({
+            'names': list(dtype_fields.keys()),
+            'formats': [column_dtype for column_dtype, _ in dtype_fields.values()],
+            'offsets': [column_offset for _, column_offset in dtype_fields.values()],
+            'itemsize': struct.calcsize(record_format),
+        })
+
+        return RecordLayout(record_format, tuple(fields), len(field_definitions), timestamp_position, timestamp_offset, record_dtype, tuple(column_types))
 
     def decode_crc(self, allow_zero) -> UnsignedInt16:
-        computed_crc = self.reader.crc_calculator.current
+        computed_crc = self.reader.crc()
         expected_crc = self.reader.read_double_byte()
 
-        self.reader.crc_calculator.reset()
-
         if allow_zero and expected_crc == UnsignedInt16(0):
             return expected_crc
 
@@ -279,120 +1184,269 @@ class Decoder:
         return byte & (1 << position) > 0
 
     @staticmethod
-    def decode_fit_file(file_name: str) -> File:
-        # Reads the binary data of the .FIT file
-        file_bytes = open(file_name, "rb").read()
+    def decode_fit_file(file_name: str, include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> File:
+        # Memory maps the .FIT file and constructs a ByteReader and Decoder object
+        with ByteReader.from_file(file_name) as byte_reader:
+            decoder = Decoder(byte_reader, include_messages, exclude_messages, projection)
 
-        # Constructs a ByteReader and Decoder object
-        byte_reader = ByteReader(file_bytes)
-        decoder = Decoder(byte_reader)
+            # Decodes the file
+            return decoder.decode_file()
 
-        # Decodes the file
-        return decoder.decode_file()
+    @staticmethod
+    def find_segments(raw_bytes: Union[bytes, bytearray, memoryview, mmap.mmap]) -> Tuple[Tuple[int, int], ...]:
+        """
+        Returns the (start, end) byte range of every header, data and CRC segment of a chained FIT file
+        Only the header size and data size of each header are read, the content is validated when the segment is decoded
+        """
+        raw_bytes = memoryview(raw_bytes).cast('B')
+
+        segments = []
+        start = 0
+        while start < len(raw_bytes):
+            if len(raw_bytes) - start < 12:
+                raise FITFileTruncatedError('Unexpected end of file encountered')
+
+            header_size = raw_bytes[start]
+            data_size = ByteReader.QUAD_BYTE.unpack_from(raw_bytes, start + 4)[0]
+            end = start + header_size + data_size + 2
+            if end > len(raw_bytes):
+                raise FITFileTruncatedError('Unexpected end of file encountered')
+
+            segments.append((start, end))
+            start = end
+
+        return tuple(segments)
 
     @staticmethod
-    def decode_fit_messages(file_name: str, error_on_undocumented_message: bool = False, error_on_undocumented_field: bool = False, error_on_invalid_enum_value: bool = False) -> Tuple[Message]:
-        # Reads the FIT file
-        file = Decoder.decode_fit_file(file_name)
+    def decode_fit_segment(file_name: str, start: int, end: int, include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> File:
+        # Decodes one segment of a chained FIT file, it only depends on its arguments so it can run in a worker process
+        with ByteReader.from_file(file_name) as byte_reader:
+            segment_reader = ByteReader(byte_reader.raw_bytes[start:end])
+            try:
+                return Decoder(segment_reader, include_messages, exclude_messages, projection).decode_file()
+            finally:
+                segment_reader.release()
 
-        try:
-            from FIT.types import MesgNum
-        except ModuleNotFoundError:
-            raise FITGeneratedCodeNotFoundError('Unable to load FIT.types, make sure you have generated the code first')
+    @staticmethod
+    def decode_chained_fit_file(file_name: str, workers: Optional[int] = None, include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> Tuple[File, ...]:
+        """
+        Decodes every segment of a chained FIT file into its own File
+        Segments are independent, each one has its own definitions, so they are decoded in parallel by a pool of worker processes
+        workers defaults to the number of processors, with a single worker (or a single segment) everything runs in the current process
+        """
+        with ByteReader.from_file(file_name) as byte_reader:
+            segments = Decoder.find_segments(byte_reader.raw_bytes)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        # Selections and projections are sent to the workers as ints, so the generated code does not need to be imported by them
+        include_messages = Decoder.message_numbers(include_messages) if include_messages is not None else None
+        exclude_messages = Decoder.message_numbers(exclude_messages) if exclude_messages is not None else None
+        projection = Decoder.resolve_projection(projection) if projection is not None else None
+
+        if workers == 1 or len(segments) <= 1:
+            return tuple(Decoder.decode_fit_segment(file_name, start, end, include_messages, exclude_messages, projection) for start, end in segments)
+
+        starts, ends = zip(*segments)
+        count = len(segments)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, count)) as executor:
+            return tuple(executor.map(Decoder.decode_fit_segment, [file_name] * count, starts, ends, [include_messages] * count, [exclude_messages] * count, [projection] * count))
+
+    @staticmethod
+    def decode_chained_fit_messages(file_name: str, workers: Optional[int] = None, error_on_undocumented_message: bool = False, error_on_undocumented_field: bool = False, error_on_invalid_enum_value: bool = False,
+                                    include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> Tuple[Message, ...]:
+        # The messages of all the segments, in file order
+        message_decoder = MessageDecoder(error_on_undocumented_message, error_on_undocumented_field, error_on_invalid_enum_value)
 
         messages = []
-        definitions = {}
-        warned_undocumented_msg_num = []
-        warned_manufacturer_specific_messages = []
-        warned_undocumented_fields = []
-        for record in file.records:
-            if isinstance(record.content, MessageDefinition):
-                definitions[record.header.local_message_type] = record.content
-                global_message_number = record.content.global_message_number
-                if global_message_number not in MesgNum._value2member_map_:
-                    is_manufacturer_specific = MesgNum.MfgRangeMin.value <= global_message_number <= MesgNum.MfgRangeMax.value
-                    if is_manufacturer_specific:
-                        warning_message = f'DefinitionMessage references MesgNum {global_message_number} which is manufacturer specific'
-                        if warning_message not in warned_manufacturer_specific_messages:
-                            warnings.warn(warning_message, FITFileContentWarning)
-                            warned_manufacturer_specific_messages.append(warning_message)
-                    else:
-                        error_message = f'DefinitionMessage references MesgNum {global_message_number} which is not documented'
-                        if error_on_undocumented_message:
-                            raise FITFileContentError(error_message)
-                        else:
-                            if error_message not in warned_undocumented_msg_num:
-                                warnings.warn(error_message, FITFileContentWarning)
-                                warned_undocumented_msg_num.append(error_message)
-
-            elif isinstance(record.content, MessageContent):
-                local_message_type = record.header.local_message_type
-
-                if local_message_type not in definitions:
-                    raise FITFileContentError(f'Local message type {local_message_type} has not been previously defined')
-
-                message_definition = definitions[local_message_type]
-
-                is_manufacturer_specific = MesgNum.MfgRangeMin.value <= message_definition.global_message_number <= MesgNum.MfgRangeMax.value
-                if is_manufacturer_specific:
-                    message_class = ManufacturerSpecificMessage  # TODO custom manufacturer specific messages
-                    class_name = ManufacturerSpecificMessage.__name__
-                else:
-                    if message_definition.global_message_number in MesgNum._value2member_map_:
-                        global_message_number = MesgNum(message_definition.global_message_number)
-                        mod = importlib.import_module('FIT.messages')
-                        message_class = getattr(mod, global_message_number.name)
-                        class_name = global_message_number.name
-                    else:
-                        message_class = UndocumentedMessage
-                        class_name = UndocumentedMessage.__name__
-
-                developer_fields = Decoder.extract_developer_fields(record, message_definition, error_on_invalid_enum_value)
-                expected_field_numbers = message_class.expected_field_numbers()
-                undocumented_fields = Decoder.extract_undocumented_fields(record.content, message_definition, expected_field_numbers, error_on_invalid_enum_value)
-                fields = Decoder.extract_fields(record.content, message_definition, expected_field_numbers)
-                message = message_class.from_extracted_fields(fields, developer_fields, undocumented_fields, error_on_invalid_enum_value)
-
-                for undocumented_field in message.undocumented_fields:
-                    error_message = f'{class_name} message has undocumented field number {undocumented_field.definition.number}'
-
-                    if error_on_undocumented_field:
-                        raise FITFileContentError(error_message)
-                    else:
-                        if error_message not in warned_undocumented_fields:
-                            warnings.warn(error_message, FITFileContentWarning)
-                            warned_undocumented_fields.append(error_message)
-
-                messages.append(message)
-            else:
-                raise FITFileContentError(f'Unexpected record type: {type(record)}')
+        for file in Decoder.decode_chained_fit_file(file_name, workers, include_messages, exclude_messages, projection):
+            message_decoder.reset_definitions()
+            messages.extend(message_decoder.decode_records(file.records))
 
         return tuple(messages)
 
     @staticmethod
-    def extract_developer_fields(record: Record, message_definition: MessageDefinition, error_on_invalid_enum_value: bool = True) -> Tuple[DeveloperMessageField]:
+    def decode_fit_columnar(file_name: str, include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> Dict[int, np.ndarray]:
+        # Memory maps the .FIT file and decodes it into one structured array per global message number
+        with ByteReader.from_file(file_name) as byte_reader:
+            decoder = Decoder(byte_reader, include_messages, exclude_messages, projection)
+            return decoder.decode_file_columnar()
+
+    @staticmethod
+    def iter_records(source: Union[str, os.PathLike, BinaryIO], include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> Iterator[Record]:
+        # Decodes the records one at a time from a file name or a binary file like object, the CRC is checked once all the records have been read
+        with StreamByteReader.from_source(source) as byte_reader:
+            decoder = Decoder(byte_reader, include_messages, exclude_messages, projection)
+            byte_reader.reset_crc()
+
+            header = decoder.decode_file_header()
+            yield from decoder.iterate_records(header.data_size)
+            decoder.decode_crc(False)
+
+    @staticmethod
+    def iter_messages(source: Union[str, os.PathLike, BinaryIO], error_on_undocumented_message: bool = False, error_on_undocumented_field: bool = False, error_on_invalid_enum_value: bool = False,
+                      include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> Iterator[Message]:
+        message_decoder = MessageDecoder(error_on_undocumented_message, error_on_undocumented_field, error_on_invalid_enum_value)
+        yield from message_decoder.decode_records(Decoder.iter_records(source, include_messages, exclude_messages, projection))
+
+    @staticmethod
+    def decode_fit_messages(file_name: str, error_on_undocumented_message: bool = False, error_on_undocumented_field: bool = False, error_on_invalid_enum_value: bool = False,
+                            include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> Tuple[Message]:
+        # The records are converted into messages as they are read, so the File object is never fully built
+        return tuple(Decoder.iter_messages(file_name, error_on_undocumented_message, error_on_undocumented_field, error_on_invalid_enum_value, include_messages, exclude_messages, projection))
+
+    @staticmethod
+    def decode_many(paths: Iterable[Union[str, os.PathLike]], workers: Optional[int] = None, mode: DecodeMode = DecodeMode.File, ordered: bool = True, chunk_size: Optional[int] = None, shared_memory: bool = False,
+                    error_on_undocumented_message: bool = False, error_on_undocumented_field: bool = False, error_on_invalid_enum_value: bool = False,
+                    include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None) -> Iterator[DecodeResult]:
+        """
+        Decodes many files with a pool of worker processes, yielding one DecodeResult per file, in input order or, if not ordered, as they complete
+        The files are submitted in chunks of chunk_size, which defaults to spreading them in about four chunks per worker
+        Errors and warnings are collected per file, a file that fails to decode does not stop the others
+        workers defaults to the number of processors, with a single worker everything runs in the current process
+        With shared_memory, only for DecodeMode.Columnar, the workers write the columns into shared memory blocks instead of pickling them back,
+        the results then hold SharedArray handles and DecodeResult.release() has to be called once the arrays are no longer needed
+        The arguments are checked when called, before any file is decoded, the returned iterator does the decoding
+        """
+        if shared_memory and mode != DecodeMode.Columnar:
+            raise ValueError(f'Shared memory transport is only available for {DecodeMode.Columnar}, {mode} requested')
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError(f'At least one worker is needed, {workers} requested')
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError(f'Chunks need at least one file, {chunk_size} requested')
+
+        paths = [os.fspath(path) for path in paths]
+
+        # Selections and projections are sent to the workers as ints, so the generated code does not need to be imported by them
+        include_messages = Decoder.message_numbers(include_messages) if include_messages is not None else None
+        exclude_messages = Decoder.message_numbers(exclude_messages) if exclude_messages is not None else None
+        projection = Decoder.resolve_projection(projection) if projection is not None else None
+        options = (mode, shared_memory, error_on_undocumented_message, error_on_undocumented_field, error_on_invalid_enum_value, include_messages, exclude_messages, projection)
+
+        return Decoder.decode_many_iterator(paths, workers, ordered, chunk_size, options)
+
+    @staticmethod
+    def decode_many_iterator(paths: List[str], workers: int, ordered: bool, chunk_size: Optional[int], options: tuple) -> Iterator[DecodeResult]:
+        # Decoding part of decode_many, with the arguments already checked and resolved
+        shared_memory = options[1]
+        items = list(enumerate(paths))
+        if workers == 1 or len(items) <= 1:
+            for index, path in items:
+                result = Decoder.decode_file_result(index, path, *options)
+                if shared_memory and result.ok:
+                    # Not pickled, so attached here as the results of the workers are when they are unpickled
+                    for column in result.value.values():
+                        column.attach()
+                yield result
+            return
+
+        if chunk_size is None:
+            chunk_size = max(1, len(items) // (4 * workers))
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            futures = [executor.submit(Decoder.decode_file_results, chunk, options) for chunk in chunks]
+            for future in (futures if ordered else concurrent.futures.as_completed(futures)):
+                yield from future.result()
+
+    @staticmethod
+    def share_columns(columns: Dict[int, np.ndarray]) -> Dict[int, SharedArray]:
+        shared = {}
+        try:
+            for global_message_number, column in columns.items():
+                shared[global_message_number] = SharedArray.create(column)
+        except BaseException:
+            for shared_array in shared.values():
+                shared_array.release()
+            raise
+        return shared
+
+    @staticmethod
+    def decode_file_results(items: List[Tuple[int, str]], options: tuple) -> List[DecodeResult]:
+        # Decodes a chunk of the files of decode_many in a worker process
+        return [Decoder.decode_file_result(index, path, *options) for index, path in items]
+
+    @staticmethod
+    def decode_file_result(index: int, path: str, mode: DecodeMode, shared_memory: bool, error_on_undocumented_message: bool, error_on_undocumented_field: bool, error_on_invalid_enum_value: bool,
+                           include_messages: MessageSelection, exclude_messages: MessageSelection, projection: FieldProjection) -> DecodeResult:
+        value = None
+        error = None
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            try:
+                if mode == DecodeMode.File:
+                    value = Decoder.decode_fit_file(path, include_messages, exclude_messages, projection)
+                elif mode == DecodeMode.Messages:
+                    value = Decoder.decode_fit_messages(path, error_on_undocumented_message, error_on_undocumented_field, error_on_invalid_enum_value, include_messages, exclude_messages, projection)
+                else:
+                    value = Decoder.decode_fit_columnar(path, include_messages, exclude_messages, projection)
+                    if shared_memory:
+                        value = Decoder.share_columns(value)
+            except Exception as e:
+                error = e
+
+        return DecodeResult(index, path, value, error, tuple([warning.message for warning in caught]))
+
+    @staticmethod
+    def extract_developer_fields(record: Record, message_definition: MessageDefinition, developer_field_cache: Optional["DeveloperFieldCache"] = None) -> Tuple[DeveloperMessageField]:
+        """
+        Decodes the developer fields of a data record with the types given by the field_description messages in the cache
+        Fields without a description, or when no cache is given, keep their raw bytes
+        """
         developer_fields = []
-        for developer_field in record.content.developer_fields:
-            pass  # TODO developer fields from record
+        byte_order = message_definition.architecture.byte_order
+        for developer_field, definition in zip(record.content.developer_fields, message_definition.developer_field_definitions):
+            if developer_field.value is None:
+                continue
+
+            description = developer_field_cache.description(definition.developer_data_index, definition.number) if developer_field_cache is not None else None
+            if description is None:
+                developer_fields.append(DeveloperMessageField(definition, developer_field.value))
+            else:
+                developer_fields.append(DeveloperMessageField(definition, Decoder.decode_developer_value(developer_field.value, description.type_class, byte_order), description))
+
         return tuple(developer_fields)
 
+    @staticmethod
+    def decode_developer_value(raw_value, type_class: type, byte_order: str = '<'):
+        # Developer fields are decoded as bytes by the record layout, as their type is only known once their field_description has been seen
+        raw_bytes = bytes(raw_value) if isinstance(raw_value, tuple) else bytes([raw_value])
+        if type_class is String:
+            return String(raw_bytes)
+
+        if len(raw_bytes) % type_class.metadata().underlying_bytes != 0:
+            raise FITFileContentError(f'Developer field of type {type_class.__name__} has size {len(raw_bytes)}, expected a multiple of {type_class.metadata().underlying_bytes}')
+
+        return type_class.from_bytes(raw_bytes, byte_order)
+
     @staticmethod
     def extract_undocumented_fields(content: MessageContent, definition: MessageDefinition, expected_field_numbers: Tuple[int] = (), error_on_invalid_enum_value: bool = True) -> Tuple[UndocumentedMessageField]:
         undocumented = []
         for field_id, (field_position, field_definition) in definition.mapped_field_definitions().items():
+            # Fields left out by a projection have not been decoded
+            if definition.layout is not None and definition.layout.fields[field_position][0] is None:
+                continue
+
             if field_id not in expected_field_numbers:
                 undocumented.append(UndocumentedMessageField(field_definition, content.fields[field_position].value))
 
         return tuple(undocumented)
 
     @staticmethod
-    def extract_fields(content: MessageContent, definition: MessageDefinition, expected_field_numbers: Tuple[int]) -> Dict[UnsignedInt8, Any]:
-        # TODO compressed timestamp
+    def extract_fields(content: MessageContent, definition: MessageDefinition, expected_field_numbers: Tuple[int], timestamp: Optional[UnsignedInt32] = None) -> Dict[UnsignedInt8, Any]:
+        # timestamp is the one resolved from a compressed timestamp header, it is used when the message has no timestamp field
         extracted_fields = {}
-        field_number_to_index_map = definition.mapped_field_definitions()
+        field_positions = definition.field_positions
         for field_number in expected_field_numbers:
-            if field_number in field_number_to_index_map:
-                extracted_fields[field_number] = content.fields[field_number_to_index_map[field_number][0]].value
+            position = field_positions[field_number]
+            if position >= 0:
+                extracted_fields[field_number] = content.fields[position].value
+            elif field_number == Decoder.TIMESTAMP_FIELD_NUMBER:
+                extracted_fields[field_number] = timestamp
             else:
                 extracted_fields[field_number] = None
 
@@ -415,3 +1469,395 @@ class Decoder:
 
         return casted
 
+
+class Accumulator:
+    """
+    Reconstructs accumulated fields, whose messages only carry the least significant bits of a running total that rolls over at their bit width
+    The last value and the total are kept per key, so consecutive batches of the same file, and single values, continue where the previous ones ended
+    """
+    def __init__(self):
+        # Key to (last value, accumulated total)
+        self.values = {}
+
+    def accumulate(self, key, values: np.ndarray, bits: int, is_reset: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Accumulates a whole column at once: each value adds its difference with the previous one, modulo 2^bits, to the total
+        The values where is_reset is set are full values instead, the total restarts from them as after set
+        """
+        if len(values) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        last, total = self.values.get(key, (0, 0))
+        values = values.astype(np.int64)
+        if is_reset is None:
+            is_reset = np.zeros(len(values), dtype=bool)
+
+        deltas = (values - np.concatenate([[last], values[:-1]])) & ((1 << bits) - 1)
+        deltas[is_reset] = 0
+        sums = np.cumsum(deltas)
+
+        # Totals restart at every reset, the same way compressed timestamps restart at every timestamp
+        groups = np.cumsum(is_reset)
+        bases = np.concatenate([[total], values[is_reset]])
+        group_starts = np.concatenate([[0], sums[is_reset]])
+        accumulated = bases[groups] + sums - group_starts[groups]
+
+        self.values[key] = (int(values[-1]), int(accumulated[-1]))
+        return accumulated
+
+    def accumulate_value(self, key, value: int, bits: int) -> int:
+        last, total = self.values.get(key, (0, 0))
+        total = total + ((value - last) & ((1 << bits) - 1))
+        self.values[key] = (value, total)
+        return total
+
+    def set(self, key, value: int) -> None:
+        self.values[key] = (value, value)
+
+    def reset(self) -> None:
+        self.values = {}
+
+
+class DeveloperFieldCache:
+    """
+    Index of the developer_data_id and field_description messages of a file, built as their records stream past
+    Each description is compiled once, so decoding a developer field of a data record costs a single lookup
+    """
+    DEVELOPER_DATA_ID_MESSAGE_NUMBER = 207
+    FIELD_DESCRIPTION_MESSAGE_NUMBER = 206
+    INDEXED_MESSAGE_NUMBERS = frozenset([DEVELOPER_DATA_ID_MESSAGE_NUMBER, FIELD_DESCRIPTION_MESSAGE_NUMBER])
+
+    # Field numbers of the developer_data_id message
+    DEVELOPER_ID_FIELD_NUMBER = 0
+    APPLICATION_ID_FIELD_NUMBER = 1
+    DEVELOPER_DATA_INDEX_FIELD_NUMBER = 3
+
+    # Field numbers of the field_description message
+    DESCRIPTION_DEVELOPER_DATA_INDEX_FIELD_NUMBER = 0
+    FIELD_DEFINITION_NUMBER_FIELD_NUMBER = 1
+    FIT_BASE_TYPE_ID_FIELD_NUMBER = 2
+    FIELD_NAME_FIELD_NUMBER = 3
+    SCALE_FIELD_NUMBER = 6
+    OFFSET_FIELD_NUMBER = 7
+    UNITS_FIELD_NUMBER = 8
+    NATIVE_MESSAGE_NUMBER_FIELD_NUMBER = 14
+    NATIVE_FIELD_NUMBER_FIELD_NUMBER = 15
+
+    def __init__(self):
+        # (developer data index, field definition number) to description
+        self.descriptions = {}
+        # Developer data index to (developer id, application id)
+        self.developer_data_ids = {}
+
+    def index(self, content: MessageContent, definition: MessageDefinition) -> None:
+        # Called with every data record, only the developer_data_id and field_description ones are kept
+        global_message_number = definition.global_message_number
+        if global_message_number == DeveloperFieldCache.FIELD_DESCRIPTION_MESSAGE_NUMBER:
+            description = DeveloperFieldCache.compile_description(content, definition)
+            if description is not None:
+                self.descriptions[(description.developer_data_index, description.field_definition_number)] = description
+        elif global_message_number == DeveloperFieldCache.DEVELOPER_DATA_ID_MESSAGE_NUMBER:
+            developer_data_index = DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.DEVELOPER_DATA_INDEX_FIELD_NUMBER)
+            if developer_data_index is not None:
+                developer_id = DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.DEVELOPER_ID_FIELD_NUMBER)
+                application_id = DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.APPLICATION_ID_FIELD_NUMBER)
+                self.developer_data_ids[developer_data_index] = (developer_id, application_id)
+
+    def description(self, developer_data_index: int, field_definition_number: int) -> Optional[DeveloperFieldDescription]:
+        return self.descriptions.get((developer_data_index, field_definition_number))
+
+    def reset(self) -> None:
+        self.descriptions = {}
+        self.developer_data_ids = {}
+
+    @staticmethod
+    def field_value(content: MessageContent, definition: MessageDefinition, number: int):
+        # Value of a field by number, None when the field is not defined or has the invalid value of its type
+        position = definition.field_positions[number]
+        if position < 0:
+            return None
+
+        value = content.fields[position].value
+        if value is None:
+            return None
+
+        type_class = BASE_TYPE_NUMBER_TO_CLASS[definition.field_definitions[position].base_type]
+        if type_class is String:
+            return str(value) if value else None
+
+        if isinstance(value, tuple):
+            return None if all([element == type_class.metadata().invalid_value for element in value]) else value
+
+        return None if value == type_class.metadata().invalid_value else int(value)
+
+    @staticmethod
+    def compile_description(content: MessageContent, definition: MessageDefinition) -> Optional[DeveloperFieldDescription]:
+        developer_data_index = DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.DESCRIPTION_DEVELOPER_DATA_INDEX_FIELD_NUMBER)
+        field_definition_number = DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.FIELD_DEFINITION_NUMBER_FIELD_NUMBER)
+        fit_base_type_id = DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.FIT_BASE_TYPE_ID_FIELD_NUMBER)
+        if developer_data_index is None or field_definition_number is None or fit_base_type_id is None:
+            return None
+
+        # Base type ids carry the endian ability bit, like the base types of the field definitions
+        type_class = BASE_TYPE_NUMBER_TO_CLASS.get(fit_base_type_id & 31)
+        if type_class is None:
+            raise FITFileContentError(f'Developer field {field_definition_number} of developer data index {developer_data_index} has unknown base type {fit_base_type_id}')
+
+        return DeveloperFieldDescription(
+            developer_data_index,
+            field_definition_number,
+            type_class,
+            DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.FIELD_NAME_FIELD_NUMBER),
+            DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.UNITS_FIELD_NUMBER),
+            DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.SCALE_FIELD_NUMBER),
+            DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.OFFSET_FIELD_NUMBER),
+            DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.NATIVE_MESSAGE_NUMBER_FIELD_NUMBER),
+            DeveloperFieldCache.field_value(content, definition, DeveloperFieldCache.NATIVE_FIELD_NUMBER_FIELD_NUMBER),
+        )
+
+
+class MessageDefinitionCache:
+    """
+    Process wide LRU cache of message definitions keyed by the raw bytes of their definition records
+    Files from the same devices repeat the same definitions, with the cache they are parsed, and their layout compiled, only once
+    The cached definitions are immutable and shared by all the decoders
+    """
+    DEFAULT_MAXSIZE = 4096
+
+    def __init__(self, maxsize: Optional[int] = DEFAULT_MAXSIZE):
+        self.resize(maxsize)
+
+    def resize(self, maxsize: Optional[int]) -> None:
+        # Resizing empties the cache and resets its counters, a maxsize of 0 disables caching and None makes it unbounded
+        self.lookup = functools.lru_cache(maxsize)(Decoder.parse_message_definition)
+
+    def get(self, raw_definition: bytes, projected_fields: Optional[FrozenSet[int]] = None) -> MessageDefinition:
+        return self.lookup(raw_definition, projected_fields)
+
+    def info(self):
+        # Named tuple with the hits, misses, maxsize and currsize of the cache
+        return self.lookup.cache_info()
+
+    def clear(self) -> None:
+        self.lookup.cache_clear()
+
+
+DEFINITION_CACHE = MessageDefinitionCache()
+
+
+class PushDecoder:
+    """
+    Incremental decoder for files that are received in chunks
+    Bytes are pushed with feed and every record completed by them is returned straight away, the bytes of a partial record are kept until the next feed
+    Headers and CRCs are checked as soon as they are received, so corrupt content is rejected before the rest of the file arrives
+    Chained files are decoded one after the other
+    """
+    decoder: Decoder
+    message_decoder: Optional['MessageDecoder']
+    header: Optional[FileHeader]
+
+    def __init__(self, message_decoder: Optional['MessageDecoder'] = None, include_messages: MessageSelection = None, exclude_messages: MessageSelection = None, projection: FieldProjection = None):
+        """
+        If a message_decoder is provided, feed returns messages instead of records
+        """
+        self.decoder = Decoder(ByteReader(b''), include_messages, exclude_messages, projection)
+        self.message_decoder = message_decoder
+        self.header = None
+        self.data_start = 0
+
+    def feed(self, data: Union[bytes, bytearray, memoryview]) -> Tuple[Union[Record, Message], ...]:
+        reader = self.decoder.reader
+
+        # Bytes already decoded are added to the CRC and dropped, the pending ones are kept in front of the new data
+        reader.crc()
+        pending = reader.raw_bytes[reader.bytes_read - reader.window_start:]
+        reader.raw_bytes = memoryview(b''.join([pending, data]))
+        reader.window_start = reader.bytes_read
+
+        records = []
+        while reader.bytes_left() > 0:
+            checkpoint = (reader.bytes_read, reader.crc_position, reader.crc_calculator.current, self.decoder.most_recent_timestamp)
+            try:
+                self.decode_next(records)
+            except FITFileTruncatedError:
+                reader.bytes_read, reader.crc_position, reader.crc_calculator.current, self.decoder.most_recent_timestamp = checkpoint
+                break
+
+        if self.message_decoder is not None:
+            return tuple(self.message_decoder.decode_records(records))
+
+        return tuple(records)
+
+    def decode_next(self, records: List[Record]) -> None:
+        reader = self.decoder.reader
+
+        if self.header is None:
+            # Both the header and the file CRC are computed from the start of the file
+            reader.reset_crc()
+            self.header = self.decoder.decode_file_header()
+            self.data_start = reader.bytes_read
+        elif reader.bytes_read - self.data_start < self.header.data_size:
+            record = self.decoder.decode_record()
+            if record is not None:
+                records.append(record)
+        else:
+            self.decoder.decode_crc(False)
+            self.header = None
+
+    def close(self) -> None:
+        """
+        Checks that the bytes fed so far form complete files
+        """
+        if self.header is not None or self.decoder.reader.bytes_left() > 0:
+            raise FITFileTruncatedError('Unexpected end of file encountered')
+
+
+class MessageDecoder:
+    """
+    Converts the records of a file into messages, one record at a time
+    It keeps track of the definitions seen so far and of the warnings already issued
+    """
+    error_on_undocumented_message: bool
+    error_on_undocumented_field: bool
+    error_on_invalid_enum_value: bool
+
+    definitions: Dict[int, MessageDefinition]
+
+    # Definition and dispatch entry of each local message type, so a data record is resolved with a single lookup
+    local_dispatch: Dict[int, Tuple[MessageDefinition, MessageDispatchEntry]]
+
+    # Dispatch entries by global message number
+    dispatch: Dict[int, MessageDispatchEntry]
+
+    def __init__(self, error_on_undocumented_message: bool = False, error_on_undocumented_field: bool = False, error_on_invalid_enum_value: bool = False):
+        try:
+            from FIT.types import MesgNum
+        except ModuleNotFoundError:
+            raise FITGeneratedCodeNotFoundError('Unable to load FIT.types, make sure you have generated the code first')
+
+        self.mesg_num = MesgNum
+        self.error_on_undocumented_message = error_on_undocumented_message
+        self.error_on_undocumented_field = error_on_undocumented_field
+        self.error_on_invalid_enum_value = error_on_invalid_enum_value
+
+        self.definitions = {}
+        self.local_dispatch = {}
+        self.dispatch = dict(MessageDecoder.dispatch_table())
+        self.accumulator = Accumulator()
+        self.developer_field_cache = DeveloperFieldCache()
+        self.warned_undocumented_msg_num = []
+        self.warned_manufacturer_specific_messages = []
+        self.warned_undocumented_fields = []
+
+    @staticmethod
+    @functools.lru_cache(1)
+    def dispatch_table() -> Dict[int, MessageDispatchEntry]:
+        # Entries of all the documented messages, built the first time they are needed
+        try:
+            from FIT.types import MesgNum
+            mod = importlib.import_module('FIT.messages')
+        except ModuleNotFoundError:
+            raise FITGeneratedCodeNotFoundError('Unable to load FIT.types and FIT.messages, make sure you have generated the code first')
+
+        table = {}
+        for global_message_number in MesgNum:
+            message_class = getattr(mod, global_message_number.name, None)
+            if message_class is not None:
+                table[int(global_message_number.value)] = MessageDispatchEntry(message_class, global_message_number.name, message_class.expected_field_numbers(), False, message_class.from_extracted_fields, getattr(message_class, 'from_field_values', None))
+
+        return table
+
+    def dispatch_entry(self, global_message_number: int) -> MessageDispatchEntry:
+        entry = self.dispatch.get(global_message_number)
+        if entry is None:
+            MesgNum = self.mesg_num
+            if MesgNum.MfgRangeMin.value <= global_message_number <= MesgNum.MfgRangeMax.value:
+                message_class = ManufacturerSpecificMessage  # TODO custom manufacturer specific messages
+                is_manufacturer_specific = True
+            else:
+                message_class = UndocumentedMessage
+                is_manufacturer_specific = False
+
+            entry = MessageDispatchEntry(message_class, message_class.__name__, message_class.expected_field_numbers(), is_manufacturer_specific, message_class.from_extracted_fields)
+            self.dispatch[global_message_number] = entry
+
+        return entry
+
+    def reset_definitions(self) -> None:
+        # Local message types, accumulated values and developer field descriptions do not carry over from one file to the next
+        self.definitions = {}
+        self.local_dispatch = {}
+        self.accumulator.reset()
+        self.developer_field_cache.reset()
+
+    def decode_records(self, records: Iterable[Record]) -> Iterator[Message]:
+        for record in records:
+            message = self.decode_record(record)
+            if message is not None:
+                yield message
+
+    def decode_record(self, record: Record) -> Optional[Message]:
+        # Definition records do not produce a message, None is returned for them
+        if isinstance(record.content, MessageDefinition):
+            self.decode_definition(record)
+            return None
+        elif isinstance(record.content, MessageContent):
+            return self.decode_message(record)
+        else:
+            raise FITFileContentError(f'Unexpected record type: {type(record)}')
+
+    def decode_definition(self, record: Record) -> None:
+        global_message_number = int(record.content.global_message_number)
+        entry = self.dispatch_entry(global_message_number)
+
+        self.definitions[record.header.local_message_type] = record.content
+        self.local_dispatch[record.header.local_message_type] = (record.content, entry)
+
+        if entry.is_manufacturer_specific:
+            warning_message = f'DefinitionMessage references MesgNum {global_message_number} which is manufacturer specific'
+            if warning_message not in self.warned_manufacturer_specific_messages:
+                warnings.warn(warning_message, FITFileContentWarning)
+                self.warned_manufacturer_specific_messages.append(warning_message)
+        elif entry.message_class is UndocumentedMessage:
+            error_message = f'DefinitionMessage references MesgNum {global_message_number} which is not documented'
+            if self.error_on_undocumented_message:
+                raise FITFileContentError(error_message)
+            else:
+                if error_message not in self.warned_undocumented_msg_num:
+                    warnings.warn(error_message, FITFileContentWarning)
+                    self.warned_undocumented_msg_num.append(error_message)
+
+    def decode_message(self, record: Record) -> Message:
+        local_dispatch = self.local_dispatch.get(record.header.local_message_type)
+        if local_dispatch is None:
+            raise FITFileContentError(f'Local message type {record.header.local_message_type} has not been previously defined')
+
+        message_definition, entry = local_dispatch
+
+        error_on_invalid_enum_value = self.error_on_invalid_enum_value
+        if record.content.developer_fields:
+            developer_fields = Decoder.extract_developer_fields(record, message_definition, self.developer_field_cache)
+        else:
+            developer_fields = ()
+        if message_definition.global_message_number in DeveloperFieldCache.INDEXED_MESSAGE_NUMBERS:
+            self.developer_field_cache.index(record.content, message_definition)
+        undocumented_fields = Decoder.extract_undocumented_fields(record.content, message_definition, entry.expected_field_numbers, error_on_invalid_enum_value)
+        timestamp = record.header.timestamp if isinstance(record.header, CompressedTimestampRecordHeader) else None
+        if entry.positional_materializer is not None:
+            # Field numbers that are not defined have position -1, which is the empty field added at the end
+            message = entry.positional_materializer(record.content.fields + Decoder.MISSING_FIELD, message_definition.field_positions, timestamp, developer_fields, undocumented_fields, error_on_invalid_enum_value, self.accumulator)
+        else:
+            fields = Decoder.extract_fields(record.content, message_definition, entry.expected_field_numbers, timestamp)
+            message = entry.materializer(fields, developer_fields, undocumented_fields, error_on_invalid_enum_value, self.accumulator)
+
+        for undocumented_field in message.undocumented_fields:
+            error_message = f'{entry.class_name} message has undocumented field number {undocumented_field.definition.number}'
+
+            if self.error_on_undocumented_field:
+                raise FITFileContentError(error_message)
+            else:
+                if error_message not in self.warned_undocumented_fields:
+                    warnings.warn(error_message, FITFileContentWarning)
+                    self.warned_undocumented_fields.append(error_message)
+
+        return message
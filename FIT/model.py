@@ -2,19 +2,26 @@
 # See LICENSE for details
 
 
-import functools
+import struct
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field, FrozenInstanceError
 from enum import Enum
-from typing import Tuple, Dict, Union
+from typing import Tuple, Dict, Union, Optional, Callable
 
 from FIT.base_types import BaseType, UnsignedInt8, UnsignedInt16, UnsignedInt32
 
+import numpy as np
+
 
 class Architecture(Enum):
     LittleEndian = UnsignedInt8(0)
     BigEndian = UnsignedInt8(1)
 
+    @property
+    def byte_order(self) -> str:
+        # Byte order character used by struct formats and NumPy dtypes
+        return '<' if self == Architecture.LittleEndian else '>'
+
 
 @dataclass(frozen=True)
 class RecordHeader:
@@ -33,6 +40,8 @@ class NormalRecordHeader(RecordHeader):
 class CompressedTimestampRecordHeader(RecordHeader):
     time_offset: UnsignedInt8
     previous_Timestamp: UnsignedInt32
+    # Absolute timestamp of the record, None if no timestamp had been decoded before it
+    timestamp: Optional[UnsignedInt32] = None
 
 
 @dataclass(frozen=True)
@@ -53,26 +62,78 @@ class FieldDefinition:
     base_type: UnsignedInt8
 
 
+@dataclass(frozen=True)
+class DeveloperFieldDefinition:
+    # The type of developer fields is given by the field_description message of their developer data index and number
+    number: UnsignedInt8
+    size: UnsignedInt8
+    developer_data_index: UnsignedInt8
+
+
+@dataclass(frozen=True)
+class RecordLayout:
+    # struct format that unpacks all the fields of a data record at once, honoring the architecture of the definition
+    record_format: str
+    # For each field: (type class, first value index, end value index, is scalar)
+    fields: Tuple[Tuple[type, int, int, bool]]
+    # The first number_of_fields entries of fields are regular fields, the rest are developer fields
+    number_of_fields: int
+    timestamp_position: Optional[int]
+    # Offset in bytes of the timestamp within the record, so it can be read from records that are skipped
+    timestamp_offset: Optional[int]
+    # Structured dtype with one column per field number, named after it, for decoding many records at once
+    record_dtype: np.dtype
+    # Base type class of each of the record_dtype columns
+    column_types: Tuple[type]
+    record_struct: struct.Struct = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'record_struct', struct.Struct(self.record_format))
+
+    def __reduce__(self):
+        # Compiled structs cannot be pickled, they are compiled again from the format
+        return RecordLayout, (self.record_format, self.fields, self.number_of_fields, self.timestamp_position, self.timestamp_offset, self.record_dtype, self.column_types)
+
+    @property
+    def size(self) -> int:
+        return self.record_struct.size
+
+
 @dataclass(frozen=True)
 class MessageDefinition(RecordContent):
     reserved_byte: UnsignedInt8
     architecture: Architecture
     global_message_number: UnsignedInt16
     field_definitions: Tuple[FieldDefinition]
-    developer_field_definitions: Tuple[FieldDefinition]
+    developer_field_definitions: Tuple[DeveloperFieldDefinition]
+    layout: Optional[RecordLayout] = field(default=None, repr=False, compare=False)
+
+    # Lookup structures built once per definition
+    field_map: Dict[UnsignedInt8, Tuple[int, FieldDefinition]] = field(init=False, repr=False, compare=False)
+    developer_field_map: Dict[UnsignedInt8, Tuple[int, DeveloperFieldDefinition]] = field(init=False, repr=False, compare=False)
+    # Position of each field number (0 to 255) in field_definitions, -1 for the numbers that are not defined
+    field_positions: Tuple[int, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        field_map = {definition.number: (i, definition) for i, definition in enumerate(self.field_definitions)}
+        field_positions = [-1] * 256
+        for number, (i, _) in field_map.items():
+            field_positions[number] = i
+
+        object.__setattr__(self, 'field_map', field_map)
+        object.__setattr__(self, 'developer_field_map', {definition.number: (i, definition) for i, definition in enumerate(self.developer_field_definitions)})
+        object.__setattr__(self, 'field_positions', tuple(field_positions))
 
-    @functools.lru_cache(1)
     def mapped_field_definitions(self) -> Dict[UnsignedInt8, Tuple[int, FieldDefinition]]:
-        return {definition.number: (i, definition) for i, definition in enumerate(self.field_definitions)}
+        return self.field_map
 
-    @functools.lru_cache(1)
-    def mapped_developer_field_definitions(self) -> Dict[UnsignedInt8, Tuple[int, FieldDefinition]]:
-        return {definition.number: (i, definition) for i, definition in enumerate(self.developer_field_definitions)}
+    def mapped_developer_field_definitions(self) -> Dict[UnsignedInt8, Tuple[int, DeveloperFieldDefinition]]:
+        return self.developer_field_map
 
     def field_definition(self, number: UnsignedInt8) -> Tuple[int, FieldDefinition]:
         return self.mapped_field_definitions()[number]
 
-    def developer_field_definition(self, number: UnsignedInt8) -> Tuple[int, FieldDefinition]:
+    def developer_field_definition(self, number: UnsignedInt8) -> Tuple[int, DeveloperFieldDefinition]:
         return self.mapped_developer_field_definitions()[number]
 
 
@@ -105,10 +166,27 @@ class File:
     crc: UnsignedInt16
 
 
+@dataclass(frozen=True)
+class DeveloperFieldDescription:
+    # What a field_description message says about a developer field, compiled once when the message is decoded
+    developer_data_index: int
+    field_definition_number: int
+    type_class: type
+    name: Optional[str]
+    units: Optional[str]
+    scale: Optional[int]
+    offset: Optional[int]
+    # Field of a regular message that the developer field stands for, if any
+    native_message_number: Optional[int]
+    native_field_number: Optional[int]
+
+
 @dataclass(frozen=True)
 class DeveloperMessageField:
-    definition: FieldDefinition
+    definition: DeveloperFieldDefinition
     value: BaseType
+    # None when no field_description message was found for the field, its value is then left as raw bytes
+    description: Optional[DeveloperFieldDescription] = None
 
 
 @dataclass(frozen=True)
@@ -119,13 +197,28 @@ class UndocumentedMessageField:
 
 @dataclass(frozen=True)
 class Message:
+    # Slots so that the generated messages can opt out of the instance __dict__, subclasses without __slots__ still get one
+    __slots__ = ('developer_fields', 'undocumented_fields')
+
     developer_fields: Tuple[DeveloperMessageField]
     undocumented_fields: Tuple[UndocumentedMessageField]
 
+    @classmethod
+    def field_names(cls) -> Tuple[str]:
+        return tuple(cls.__dataclass_fields__.keys())
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.field_names())
+
+    def __setstate__(self, state):
+        # Messages pickled before Message had __slots__ carry their __dict__ as state
+        for name, value in state.items() if isinstance(state, dict) else zip(self.field_names(), state):
+            object.__setattr__(self, name, value)
+
     def _xstr_(self):
         last_fields = ['developer_fields', 'undocumented_fields']
         new_last_fields = []
-        fields = list(self.__dataclass_fields__.keys())
+        fields = list(self.field_names())
         for last_field in last_fields:
             if last_field in fields:
                 fields.remove(last_field)
@@ -133,7 +226,7 @@ class Message:
 
         field_strs = []
         for k in fields:
-            field_val = self.__dict__[k]
+            field_val = getattr(self, k)
             if field_val is not None:
                 if isinstance(field_val, tuple):
                     if len(field_val) == 0:
@@ -153,28 +246,152 @@ class Message:
         return f'{type(self).__name__}({fields_str})'
 
 
+class SparseField:
+    # Attribute of a SparseMessage, reads the index-th field of the message from the values that are present
+    __slots__ = ('index', 'mask', 'name')
+
+    def __init__(self, index: int):
+        self.index = index
+        self.mask = (1 << index) - 1
+        self.name = None
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        present = instance.present
+        if not (present >> self.index) & 1:
+            return None
+        return instance.values[bin(present & self.mask).count('1')]
+
+
+class SparseMessage(Message):
+    # Message that only stores the fields that have a value, bit i of present is set when the i-th field is stored in values
+    __slots__ = ('present', 'values')
+
+    sparse_field_names: Tuple[str] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.sparse_field_names = tuple(name for name, value in cls.__dict__.items() if isinstance(value, SparseField))
+
+    def __init__(self, developer_fields: Tuple[DeveloperMessageField], undocumented_fields: Tuple[UndocumentedMessageField], *field_values):
+        if len(field_values) != len(self.sparse_field_names):
+            raise TypeError(f'{type(self).__name__} expects {len(self.sparse_field_names)} field values, got {len(field_values)}')
+
+        present = 0
+        values = []
+        for i, value in enumerate(field_values):
+            if value is not None:
+                present = present | (1 << i)
+                values.append(value)
+
+        object.__setattr__(self, 'developer_fields', developer_fields)
+        object.__setattr__(self, 'undocumented_fields', undocumented_fields)
+        object.__setattr__(self, 'present', present)
+        object.__setattr__(self, 'values', tuple(values))
+
+    @classmethod
+    def field_names(cls) -> Tuple[str]:
+        return ('developer_fields', 'undocumented_fields') + cls.sparse_field_names
+
+    def __getstate__(self):
+        return self.developer_fields, self.undocumented_fields, self.present, self.values
+
+    def __setstate__(self, state):
+        for name, value in zip(('developer_fields', 'undocumented_fields', 'present', 'values'), state):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f'cannot assign to field {name!r}')
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f'cannot delete field {name!r}')
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.__getstate__() == other.__getstate__()
+
+    def __hash__(self):
+        return hash(self.__getstate__())
+
+    def __repr__(self):
+        return f'{type(self).__qualname__}({", ".join([name + "=" + repr(getattr(self, name)) for name in self.field_names()])})'
+
+
 @dataclass(frozen=True)
 class ManufacturerSpecificMessage(Message):
+    __slots__ = ()
+
     @staticmethod
     def expected_field_numbers() -> Tuple[int]:
         return ()
 
     @staticmethod
-    def from_extracted_fields(extracted_fields, developer_fields: Tuple[DeveloperMessageField], undocumented_fields: Tuple[UndocumentedMessageField], error_on_invalid_enum_value: bool) -> "ManufacturerSpecificMessage":
+    def from_extracted_fields(extracted_fields, developer_fields: Tuple[DeveloperMessageField], undocumented_fields: Tuple[UndocumentedMessageField], error_on_invalid_enum_value: bool, accumulator=None) -> "ManufacturerSpecificMessage":
         return ManufacturerSpecificMessage(developer_fields, undocumented_fields)
 
 
 @dataclass(frozen=True)
 class UndocumentedMessage(Message):
+    __slots__ = ()
+
     @staticmethod
     def expected_field_numbers() -> Tuple[int]:
         return ()
 
     @staticmethod
-    def from_extracted_fields(extracted_fields, developer_fields: Tuple[DeveloperMessageField], undocumented_fields: Tuple[UndocumentedMessageField], error_on_invalid_enum_value: bool) -> "UndocumentedMessage":
+    def from_extracted_fields(extracted_fields, developer_fields: Tuple[DeveloperMessageField], undocumented_fields: Tuple[UndocumentedMessageField], error_on_invalid_enum_value: bool, accumulator=None) -> "UndocumentedMessage":
         return UndocumentedMessage(developer_fields, undocumented_fields)
 
 
+@dataclass(frozen=True)
+class MessageDispatchEntry:
+    # How the data records of a global message number are turned into messages, resolved once per global message number
+    message_class: type
+    class_name: str
+    expected_field_numbers: Tuple[int]
+    is_manufacturer_specific: bool
+    # from_extracted_fields of message_class
+    materializer: Callable
+    # from_field_values of message_class, when the generated code provides it
+    positional_materializer: Optional[Callable] = None
+
+
+@dataclass(frozen=True)
+class ComponentExpansion:
+    # How one component of a field is unpacked into its destination field, precomputed from the profile by the code generator
+    source_name: str
+    source_number: Optional[int]
+    # Base type classes of the source and destination fields
+    source_type: type
+    destination_name: str
+    destination_number: Optional[int]
+    destination_type: type
+    # Position of the component bits in the source value, arrays are read as a single little endian value
+    bit_offset: int
+    bits: int
+    # The destination value is component * factor + shift, which converts from the scale and offset of the component to the ones of the destination
+    factor: float
+    shift: float
+    accumulated: bool
+    # Components of dynamic fields unpack the field they reinterpret, and only when one of the reference fields, as (field number, raw value), matches
+    reinterpreted_number: Optional[int] = None
+    selectors: Tuple[Tuple[int, int], ...] = ()
+    element_bits: int = field(init=False, repr=False, compare=False)
+    mask: int = field(init=False, repr=False, compare=False)
+    is_integer: bool = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'element_bits', 8 * self.source_type.metadata().underlying_bytes)
+        object.__setattr__(self, 'mask', (1 << self.bits) - 1)
+        object.__setattr__(self, 'is_integer', np.dtype(self.destination_type.metadata().numpy_type).kind in 'ui')
+
+
 @dataclass(frozen=True)
 class FieldMetadata:
     name: str
@@ -202,12 +419,16 @@ class NormalFieldMetadata(FieldMetadata):
 @dataclass(frozen=True)
 class MessageMetadata:
     fields_metadata: Tuple[FieldMetadata]
+    numbers: Tuple[int] = field(init=False, repr=False, compare=False)
+    names: Tuple[str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'numbers', tuple([field_metadata.number for field_metadata in self.fields_metadata if isinstance(field_metadata, NormalFieldMetadata)]))
+        object.__setattr__(self, 'names', tuple([field_metadata.name for field_metadata in self.fields_metadata]))
 
-    @functools.lru_cache(1)
     def field_numbers(self) -> Tuple[int]:
-        return tuple([field_metadata.number for field_metadata in self.fields_metadata if isinstance(field_metadata, NormalFieldMetadata)])
+        return self.numbers
 
-    @functools.lru_cache(1)
     def field_names(self) -> Tuple[str]:
-        return tuple([field_metadata.name for field_metadata in self.fields_metadata])
+        return self.names
 
@@ -3,14 +3,17 @@
 
 
 import functools
+import json
+import os
+import tempfile
 import zipfile
 import hashlib
 import xlrd
 import warnings
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 from enum import Enum
-from typing import Union, Tuple, List, Set, Iterable, Optional
+from typing import Union, Tuple, List, Set, Iterable, Optional, Any, Dict
 from FIT.base_types import BASE_TYPE_NAME_MAP
 
 
@@ -152,9 +155,23 @@ DataTable = List[DataRow]
 class MessageProfile:
     """
     Holds the information for a message in the profile
+    The fields are also indexed by name and by number, the dynamic fields have no number so they are only indexed by name
     """
     name: str
     fields: Union[Tuple[()], Tuple[MessageFieldProfile]]
+    fields_by_name: Dict[str, MessageFieldProfile] = field(init=False, repr=False, compare=False)
+    fields_by_number: Dict[int, MessageFieldProfile] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        fields_by_name = {}
+        fields_by_number = {}
+        for field_profile in self.fields:
+            fields_by_name.setdefault(field_profile.name, field_profile)
+            if field_profile.number is not None:
+                fields_by_number.setdefault(field_profile.number, field_profile)
+
+        object.__setattr__(self, 'fields_by_name', fields_by_name)
+        object.__setattr__(self, 'fields_by_number', fields_by_number)
 
 
 class ProfileCorrector:
@@ -299,14 +316,41 @@ DEFAULT_PROFILE_CORRECTOR = {
 }
 
 
+# Version of the JSON format of the cached profiles, bumped whenever the profile data classes or the parsing change so stale caches are ignored
+PROFILE_CACHE_FORMAT_VERSION = 1
+
+
 @dataclass(frozen=True)
 class Profile:
     """
     Holds the entire profile including types and messages
+    The types are indexed by name and the messages by name and by global message number, as given by the mesg_num type
     """
     version: ProfileVersion
     types: Tuple[TypeProfile]
     messages: Tuple[MessageProfile]
+    types_by_name: Dict[str, TypeProfile] = field(init=False, repr=False, compare=False)
+    messages_by_name: Dict[str, MessageProfile] = field(init=False, repr=False, compare=False)
+    messages_by_number: Dict[int, MessageProfile] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        types_by_name = {}
+        for type_profile in self.types:
+            types_by_name.setdefault(type_profile.name, type_profile)
+
+        messages_by_name = {}
+        for message in self.messages:
+            messages_by_name.setdefault(message.name, message)
+
+        messages_by_number = {}
+        if 'mesg_num' in types_by_name:
+            for value in types_by_name['mesg_num'].values:
+                if value.name in messages_by_name:
+                    messages_by_number.setdefault(int(value.value, 0) if isinstance(value.value, str) else int(value.value), messages_by_name[value.name])
+
+        object.__setattr__(self, 'types_by_name', types_by_name)
+        object.__setattr__(self, 'messages_by_name', messages_by_name)
+        object.__setattr__(self, 'messages_by_number', messages_by_number)
 
     @functools.lru_cache(1)
     def units(self) -> Tuple[str]:
@@ -332,6 +376,83 @@ class Profile:
 
         return tuple(units)
 
+    @staticmethod
+    @functools.lru_cache(1)
+    def _json_classes() -> dict:
+        return {cls.__name__: cls for cls in [NamedValueProfile, TypeProfile, ComponentProfile, DynamicFieldMatcher, MessageScalarFieldProfile, MessageComponentFieldProfile, MessageProfile]}
+
+    @staticmethod
+    def _to_json_value(value: Any) -> Any:
+        """
+        Data classes are encoded as an object with the class name and the list of field values, tuples as lists
+        """
+        if isinstance(value, tuple):
+            return [Profile._to_json_value(element) for element in value]
+        elif type(value).__name__ in Profile._json_classes():
+            return {'class': type(value).__name__, 'values': [Profile._to_json_value(getattr(value, value_field.name)) for value_field in fields(value) if value_field.init]}
+        else:
+            return value
+
+    @staticmethod
+    def _from_json_value(value: Any) -> Any:
+        if isinstance(value, list):
+            return tuple([Profile._from_json_value(element) for element in value])
+        elif isinstance(value, dict):
+            return Profile._json_classes()[value['class']](*[Profile._from_json_value(element) for element in value['values']])
+        else:
+            return value
+
+    def to_json(self) -> str:
+        """
+        Serializes the profile into a compact JSON string that from_json() turns back into an equal profile
+        """
+        content = {'format_version': PROFILE_CACHE_FORMAT_VERSION, 'version': self.version.name, 'types': Profile._to_json_value(self.types), 'messages': Profile._to_json_value(self.messages)}
+        return json.dumps(content, separators=(',', ':'))
+
+    @staticmethod
+    def from_json(content: str) -> "Profile":
+        content = json.loads(content)
+        if content['format_version'] != PROFILE_CACHE_FORMAT_VERSION:
+            raise ProfileContentError(f'Cached profile format version {content["format_version"]} does not match the current version {PROFILE_CACHE_FORMAT_VERSION}')
+
+        return Profile(ProfileVersion[content['version']], Profile._from_json_value(content['types']), Profile._from_json_value(content['messages']))
+
+    @staticmethod
+    def _cache_file_name(cache_dir: str, source_hash: str, version: ProfileVersion, profile_corrector: ProfileCorrector, strict: bool) -> str:
+        """
+        The cached profile depends on the source file, the corrector and the strictness of the parsing
+        Correctors are told apart only by their class, so a corrector used with a cache must be stateless
+        """
+        key = f'{PROFILE_CACHE_FORMAT_VERSION}:{source_hash}:{version.name}:{type(profile_corrector).__module__}.{type(profile_corrector).__qualname__}:{strict}'
+        return os.path.join(cache_dir, f'profile_{version.name}_{hashlib.sha256(key.encode("utf-8")).hexdigest()[0:16]}.json')
+
+    @staticmethod
+    def _load_cached(cache_file_name: str) -> Optional["Profile"]:
+        """
+        Returns None if there is no usable cached profile, a corrupted or stale cache is simply parsed again
+        """
+        try:
+            with open(cache_file_name, 'r', encoding='utf-8') as file:
+                return Profile.from_json(file.read())
+        except (OSError, ValueError, KeyError, TypeError, ProfileContentError):
+            return None
+
+    @staticmethod
+    def _store_cached(cache_file_name: str, profile: "Profile"):
+        """
+        The profile is written to a temporary file that replaces the cache file, so a concurrent reader never sees a partial file
+        """
+        cache_dir = os.path.dirname(cache_file_name)
+        os.makedirs(cache_dir, exist_ok=True)
+        file_descriptor, temporary_file_name = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+        try:
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+                file.write(profile.to_json())
+            os.replace(temporary_file_name, cache_file_name)
+        except BaseException:
+            os.remove(temporary_file_name)
+            raise
+
     @staticmethod
     def duplicates(elements: Iterable) -> Set:
         """
@@ -597,19 +718,17 @@ class Profile:
         message = MessageProfile(message_name, tuple(fields))
         message = profile_corrector.correct_message(message)
 
-        field_names = [inner_field.name for inner_field in message.fields]
-        for i in range(0, len(message.fields)):
-            field = message.fields[i]
+        for field_profile in message.fields:
             # Check that the reference fields of the dynamic fields exist
-            for marcher in field.dynamic_field_matchers:
-                if marcher.ref_field_name not in field_names:
-                    raise ProfileContentError(f'Profile {version.version_str()} message "{message.name}" dynamic field "{field.name}" has unknown ref_field_name "{marcher.ref_field_name}"')
+            for marcher in field_profile.dynamic_field_matchers:
+                if marcher.ref_field_name not in message.fields_by_name:
+                    raise ProfileContentError(f'Profile {version.version_str()} message "{message.name}" dynamic field "{field_profile.name}" has unknown ref_field_name "{marcher.ref_field_name}"')
 
             # In case it is a component field, we check that the destination field exists after this field
-            if isinstance(field, MessageComponentFieldProfile):
-                for component in field.components:
-                    if component.destination_field not in field_names:
-                        raise ProfileContentError(f'Profile {version.version_str()} message "{message.name}" component field "{field.name}" has unknown destination field "{component.destination_field}"')
+            if isinstance(field_profile, MessageComponentFieldProfile):
+                for component in field_profile.components:
+                    if component.destination_field not in message.fields_by_name:
+                        raise ProfileContentError(f'Profile {version.version_str()} message "{message.name}" component field "{field_profile.name}" has unknown destination field "{component.destination_field}"')
 
         return message
 
@@ -672,22 +791,20 @@ class Profile:
         types = Profile._parse_types(types_table, version, profile_corrector, strict)
         messages = Profile._parse_messages(messages_table, version, profile_corrector)
 
+        # The checks below use the indexes of the profile, so they take linear time in the size of the profile
+        profile = Profile(version, types, messages)
+
         # We find the mesg_num type definition since we know it is an enum like type that contains all the known messages
-        mesg_num_profile = None
-        for type_def in types:
-            if type_def.name == 'mesg_num':
-                mesg_num_profile = type_def
-                break
+        mesg_num_profile = profile.types_by_name.get('mesg_num')
 
         # If there is no mesg_num type, the profile data is inconsistent
         if not mesg_num_profile:
             raise ProfileContentError('The profile does not contain a "mesg_num" type definition')
 
         # We perform some consistency checks
-        message_names = [message.name for message in messages]
         missing_message_type = []
         for value in mesg_num_profile.values:
-            if value.name not in message_names:  # If there is no message found
+            if value.name not in profile.messages_by_name:  # If there is no message found
                 if value.name not in ['mfg_range_min', 'mfg_range_max']:  # And the name is not one of the manufacturer specific range constants
                     missing_message_type.append(f'{value.name} ({value.value})')  # We add it to the missing messages
 
@@ -697,10 +814,11 @@ class Profile:
             Profile._non_fatal_error(error_message, strict)
 
         # We check for messages that have been defined, but do not have a corresponding entry in mesg_num
+        mesg_num_names = {value.name for value in mesg_num_profile.values}
         missing_mesg_num_value = []
-        for message_name in message_names:
-            if message_name not in [value.name for value in mesg_num_profile.values]:
-                missing_mesg_num_value.append(message_name)
+        for message in messages:
+            if message.name not in mesg_num_names:
+                missing_mesg_num_value.append(message.name)
 
         # Issue the errors / warnings
         if missing_mesg_num_value:
@@ -708,25 +826,34 @@ class Profile:
             Profile._non_fatal_error(error_message, strict)
 
         # Check that all types in message fields are defined
-        type_names = [type_profile.name for type_profile in types] + list(BASE_TYPE_NAME_MAP.keys())
         for message in messages:
-            for field in message.fields:
-                if field.type not in type_names:
-                    raise ProfileContentError(f'Profile {version.version_str()} message "{message.name}" field "{field.name}" has undefined type "{field.type}"')
+            for field_profile in message.fields:
+                if field_profile.type not in profile.types_by_name and field_profile.type not in BASE_TYPE_NAME_MAP:
+                    raise ProfileContentError(f'Profile {version.version_str()} message "{message.name}" field "{field_profile.name}" has undefined type "{field_profile.type}"')
 
-        return profile_corrector.correct_profile(Profile(version, types, messages))
+        return profile_corrector.correct_profile(profile)
 
     @staticmethod
-    def from_xlsx(file: Union[str, bytes], version: ProfileVersion, profile_corrector: ProfileCorrector = None, strict: bool = True) -> "Profile":
+    def from_xlsx(file: Union[str, bytes], version: ProfileVersion, profile_corrector: ProfileCorrector = None, strict: bool = True, cache_dir: Optional[str] = None) -> "Profile":
         """
         This high level function will take either the file name or the bytes content of the file and parse the corresponding profile
         See from_tables() for information on the optional arguments
+        If cache_dir is given, the parsed profile is cached there as JSON keyed by the SHA256 of the file and loaded from it in later calls,
+        the corrector is only identified by its class so it must be stateless
         """
 
         # obtain the default corrector for the version if not explicitly specified
         if not profile_corrector:
             profile_corrector = DEFAULT_PROFILE_CORRECTOR[version]
 
+        cache_file_name = None
+        if cache_dir is not None:
+            file_hash = Profile._sha256(file) if type(file) == str else hashlib.sha256(file).hexdigest().upper()
+            cache_file_name = Profile._cache_file_name(cache_dir, file_hash, version, profile_corrector, strict)
+            profile = Profile._load_cached(cache_file_name)
+            if profile is not None:
+                return profile
+
         # Get the contents of the xlsx file
         if type(file) == str:
             book = xlrd.open_workbook(file)
@@ -754,7 +881,12 @@ class Profile:
         messages_table = Profile._extract_data(messages_sheet)
 
         # Hand over to the profile parser from plain data
-        return Profile._from_tables(types_table, messages_table, version, profile_corrector, strict)
+        profile = Profile._from_tables(types_table, messages_table, version, profile_corrector, strict)
+
+        if cache_file_name is not None:
+            Profile._store_cached(cache_file_name, profile)
+
+        return profile
 
     @staticmethod
     def _sha256(file_name: str) -> str:
@@ -774,11 +906,13 @@ class Profile:
         return algo.hexdigest().upper()
 
     @staticmethod
-    def from_sdk_zip(file_name: str, profile_corrector: ProfileCorrector = None, strict: bool = True) -> "Profile":
+    def from_sdk_zip(file_name: str, profile_corrector: ProfileCorrector = None, strict: bool = True, cache_dir: Optional[str] = None) -> "Profile":
         """
         High level function that given the SDK file will do all the necessary steps to extract a profile
         It is the most convenient way to create a profile object which is later needed to generate the code
         See from_tables() for information on the optional arguments
+        If cache_dir is given, the parsed profile is cached there as JSON keyed by the SHA256 of the SDK file, so later calls skip the xlsx parsing,
+        the corrector is only identified by its class so it must be stateless
         """
 
         # Compute the hash and check that it is a known version
@@ -789,13 +923,26 @@ class Profile:
         # Get the corresponding version
         version = SDK_ZIP_SHA256[file_hash]
 
-        # Extract the Profile.xlsx from the zip file
-        zf = zipfile.ZipFile(file_name, 'r')
-        zip_file_content = zf.read('Profile.xlsx')
-
         # obtain the default corrector for the version if not explicitly specified
         if not profile_corrector:
             profile_corrector = DEFAULT_PROFILE_CORRECTOR[version]
 
+        # The known hash of the SDK file identifies the profile, so a cached profile is loaded without opening the zip file
+        cache_file_name = None
+        if cache_dir is not None:
+            cache_file_name = Profile._cache_file_name(cache_dir, file_hash, version, profile_corrector, strict)
+            profile = Profile._load_cached(cache_file_name)
+            if profile is not None:
+                return profile
+
+        # Extract the Profile.xlsx from the zip file
+        with zipfile.ZipFile(file_name, 'r') as zf:
+            zip_file_content = zf.read('Profile.xlsx')
+
         # Hand over to the profile parser given an xlsx file
-        return Profile.from_xlsx(zip_file_content, version, profile_corrector, strict)
+        profile = Profile.from_xlsx(zip_file_content, version, profile_corrector, strict)
+
+        if cache_file_name is not None:
+            Profile._store_cached(cache_file_name, profile)
+
+        return profile
@@ -0,0 +1,86 @@
+# Copyright 2019 Joan Puig
+# See LICENSE for details
+
+
+import functools
+import struct
+import timeit
+
+from FIT.decoder import Decoder, ByteReader, CRCCalculator
+from FIT.model import MessageContent
+
+
+def interleaved_fit_file(records: int) -> bytes:
+    # A record message (global 20) and an hrv message (global 78) alternating, each with its own local message type
+    record_fields = [(253, 4, 0x86), (0, 4, 0x85), (1, 4, 0x85), (2, 2, 0x84), (3, 1, 0x02), (4, 1, 0x02), (5, 4, 0x86), (6, 2, 0x84)]
+    hrv_fields = [(0, 10, 0x84)]
+
+    data = bytearray()
+    for local_message_type, global_message_number, field_definitions in [(0, 20, record_fields), (1, 78, hrv_fields)]:
+        data += bytes([0x40 | local_message_type, 0, 0]) + struct.pack('<H', global_message_number) + bytes([len(field_definitions)])
+        for field_definition in field_definitions:
+            data += bytes(field_definition)
+
+    for i in range(0, records):
+        data += bytes([0]) + struct.pack('<IiiHBBIH', 1000000000 + i, i, -i, 1000, 120, 90, i * 10, 3000)
+        data += bytes([1]) + struct.pack('<5H', 800, 810, 820, 0xFFFF, 0xFFFF)
+
+    header = struct.pack('<BBHI4s', 14, 0x20, 2096, len(data), b'.FIT')
+    header = header + struct.pack('<H', CRCCalculator.compute(header))
+    content = header + bytes(data)
+    return content + struct.pack('<H', CRCCalculator.compute(content))
+
+
+@functools.lru_cache(1)
+def single_entry_field_map(definition):
+    # Lookup map as it used to be cached: a single cache entry shared by all the definitions
+    return {field_definition.number: (i, field_definition) for i, field_definition in enumerate(definition.field_definitions)}
+
+
+def extract_fields_single_entry_cache(content, definition, expected_field_numbers):
+    extracted_fields = {}
+    field_number_to_index_map = single_entry_field_map(definition)
+    for field_number in expected_field_numbers:
+        if field_number in field_number_to_index_map:
+            extracted_fields[field_number] = content.fields[field_number_to_index_map[field_number][0]].value
+        else:
+            extracted_fields[field_number] = None
+
+    return extracted_fields
+
+
+def main():
+    # Measures the field extraction of files in which two local message types interleave, as is common in activity files with hrv data
+
+    # Modify to change the size of the benchmark
+    records = 20000
+    repeat = 5
+
+    decoder = Decoder(ByteReader(interleaved_fit_file(records)))
+    file = decoder.decode_file()
+
+    definitions = {}
+    data_records = []
+    for record in file.records:
+        if isinstance(record.content, MessageContent):
+            definition = definitions[record.header.local_message_type]
+            expected_field_numbers = (253, 0, 1, 2, 3, 4, 5, 6, 7) if definition.global_message_number == 20 else (0,)
+            data_records.append((record.content, definition, expected_field_numbers))
+        else:
+            definitions[record.header.local_message_type] = record.content
+
+    def single_entry_cache():
+        for content, definition, expected_field_numbers in data_records:
+            extract_fields_single_entry_cache(content, definition, expected_field_numbers)
+
+    def per_definition_positions():
+        for content, definition, expected_field_numbers in data_records:
+            Decoder.extract_fields(content, definition, expected_field_numbers)
+
+    for name, function in [('single entry lru_cache', single_entry_cache), ('per definition positions', per_definition_positions)]:
+        best = min(timeit.repeat(function, number=1, repeat=repeat))
+        print(f'{name:<26}: {best * 1000:8.1f} ms for {len(data_records)} records, {best / len(data_records) * 1e6:6.2f} us per record')
+
+
+if __name__ == "__main__":
+    main()
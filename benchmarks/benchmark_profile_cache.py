@@ -0,0 +1,39 @@
+# Copyright 2019 Joan Puig
+# See LICENSE for details
+
+
+import tempfile
+import timeit
+
+from FIT.profile import Profile
+
+
+def main():
+    # Compares loading the profile from the SDK zip file by parsing Profile.xlsx (cold) against loading the cached JSON profile (warm)
+
+    # Modify to fit your directory setup
+    sdk_zip_file = './data/SDK/FitSDKRelease_Latest.zip'
+
+    # Modify to change the size of the benchmark
+    repeat = 3
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        parsed_profile = Profile.from_sdk_zip(sdk_zip_file)
+
+        def cold():
+            Profile.from_sdk_zip(sdk_zip_file)
+
+        def warm():
+            Profile.from_sdk_zip(sdk_zip_file, cache_dir=cache_dir)
+
+        # Fills the cache and checks that the cached profile is the same as the parsed one
+        warm()
+        assert Profile.from_sdk_zip(sdk_zip_file, cache_dir=cache_dir) == parsed_profile
+
+        for name, function in [('cold, parsing Profile.xlsx', cold), ('warm, cached JSON', warm)]:
+            best = min(timeit.repeat(function, number=1, repeat=repeat))
+            print(f'{name:<26}: {best * 1000:8.1f} ms')
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,16 @@
 # See LICENSE for details
 
 
+import pickle
 import pytest
 
-# TODO test base types
\ No newline at end of file
+from FIT.base_types import String
+
+# TODO test base types
+
+
+def test_string_from_bytes():
+    assert String(b'run\x00\x00\x00') == 'run'
+    assert String.from_bytes(memoryview('caf\u00e9'.encode('utf-8') + b'\x00')) == 'caf\u00e9'
+    assert String(b'') == ''
+    assert pickle.loads(pickle.dumps(String(b'run\x00'))) == String('run')
@@ -0,0 +1,98 @@
+# Copyright 2019 Joan Puig
+# See LICENSE for details
+
+
+import os
+import pytest
+
+import numpy as np
+
+from FIT.decoder import Decoder
+from test.test_decoder import fit_file, data_record, FILE_ID_DATA
+
+
+pytest.importorskip('FIT.messages')
+
+from FIT.cache import DecodeCache
+
+
+def write_fit_file(path, content: bytes) -> str:
+    with open(path, 'wb') as file:
+        file.write(content)
+    return str(path)
+
+
+def test_decode_cache(tmp_path):
+    cache = DecodeCache(tmp_path / 'cache')
+    file_name = write_fit_file(tmp_path / 'a.fit', fit_file(FILE_ID_DATA + data_record(0, '<BH', 5, 2)))
+    copy_name = write_fit_file(tmp_path / 'b.fit', fit_file(FILE_ID_DATA + data_record(0, '<BH', 5, 2)))
+
+    columns = cache.decode_fit_columnar(file_name)
+    assert len(cache.entries()) == 1
+
+    # Same content under another name is a hit, served from memory mapped files
+    cached = cache.decode_fit_columnar(copy_name)
+    assert len(cache.entries()) == 1
+    assert isinstance(cached[0], np.memmap)
+    assert not cached[0].flags.writeable
+    assert np.array_equal(cached[0], columns[0])
+    assert np.array_equal(cached[0], Decoder.decode_fit_columnar(file_name)[0])
+
+    # Options are part of the key
+    assert cache.decode_fit_columnar(file_name, exclude_messages=[0]) == {}
+    assert len(cache.entries()) == 2
+
+    cache.clear()
+    assert cache.entries() == []
+    assert np.array_equal(cache.decode_fit_columnar(file_name)[0], columns[0])
+
+
+def test_decode_cache_corrupted_entry(tmp_path):
+    cache = DecodeCache(tmp_path / 'cache')
+    file_name = write_fit_file(tmp_path / 'a.fit', fit_file(FILE_ID_DATA + data_record(0, '<BH', 5, 2)))
+    columns = cache.decode_fit_columnar(file_name)
+
+    key = cache.entries()[0][2]
+    npy_file_name = os.path.join(cache.entry_path(key), '0.npy')
+    with open(npy_file_name, 'r+b') as file:
+        file.truncate(os.path.getsize(npy_file_name) - 1)
+
+    # The truncated entry is a miss, the file is decoded again and the entry replaced
+    assert cache.load(key) is None
+    assert cache.entries() == []
+    assert np.array_equal(cache.decode_fit_columnar(file_name)[0], columns[0])
+    assert np.array_equal(cache.load(key)[0], columns[0])
+
+
+def test_decode_cache_eviction(tmp_path):
+    file_names = [write_fit_file(tmp_path / f'{i}.fit', fit_file(FILE_ID_DATA + data_record(0, '<BH', i, 2))) for i in range(0, 3)]
+    cache = DecodeCache(tmp_path / 'cache')
+    cache.decode_fit_columnar(file_names[0])
+    entry_size = cache.entries()[0][1]
+
+    cache = DecodeCache(tmp_path / 'cache', max_size=2 * entry_size)
+    cache.decode_fit_columnar(file_names[1])
+    first_key, second_key = [DecodeCache.key(DecodeCache.file_digest(file_name), DecodeCache.options_key()) for file_name in file_names[0:2]]
+    os.utime(cache.entry_path(first_key), (0, 0))
+    os.utime(cache.entry_path(second_key), (1, 1))
+
+    # Using the oldest entry makes the other one the least recently used
+    cache.decode_fit_columnar(file_names[0])
+    cache.decode_fit_columnar(file_names[2])
+    keys = [key for _, _, key in cache.entries()]
+    assert len(keys) == 2
+    assert first_key in keys
+    assert second_key not in keys
+    assert not any([name.startswith(DecodeCache.TEMPORARY_PREFIX) for name in os.listdir(cache.directory)])
+
+    # Listing the entries leaves temporary directories alone, only stale ones are removed, on eviction
+    fresh_path = os.path.join(cache.directory, f'{DecodeCache.TEMPORARY_PREFIX}fresh')
+    stale_path = os.path.join(cache.directory, f'{DecodeCache.TEMPORARY_PREFIX}stale')
+    os.mkdir(fresh_path)
+    os.mkdir(stale_path)
+    os.utime(stale_path, (0, 0))
+    cache.entries()
+    assert os.path.isdir(stale_path)
+    cache.evict()
+    assert os.path.isdir(fresh_path)
+    assert not os.path.isdir(stale_path)
@@ -2,6 +2,654 @@
 # See LICENSE for details
 
 
+import dataclasses
+import io
+import os
+import pickle
+import struct
+import subprocess
+import sys
+import time
 import pytest
 
-# TODO test decoder
\ No newline at end of file
+import numpy as np
+
+from FIT.base_types import UnsignedInt8, UnsignedInt16, UnsignedInt32, String
+from FIT.decoder import CRCCalculator, ByteReader, StreamByteReader, Decoder, PushDecoder, MessageDecoder, Accumulator, DecodeMode, SharedArray, FITFileContentError, FITFileContentWarning, MessageDefinitionCache, DEFINITION_CACHE
+from FIT.model import Architecture, FieldDefinition, DeveloperFieldDefinition, MessageContent, MessageDefinition, CompressedTimestampRecordHeader
+
+
+def bitwise_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = crc ^ byte
+        for _ in range(0, 8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def fit_file(data: bytes, header_size: int = 14) -> bytes:
+    header = struct.pack('<BBHI4s', header_size, 0x20, 2096, len(data), b'.FIT')
+    if header_size == 14:
+        header = header + struct.pack('<H', bitwise_crc(header))
+    content = header + data
+    return content + struct.pack('<H', bitwise_crc(content))
+
+
+def definition_record(local_message_type: int, global_message_number: int, field_definitions, architecture: int = 0) -> bytes:
+    content = bytes([0x40 | local_message_type, 0, architecture]) + struct.pack('<>'[architecture] + 'H', global_message_number) + bytes([len(field_definitions)])
+    for field_definition in field_definitions:
+        content = content + bytes(field_definition)
+    return content
+
+
+def data_record(local_message_type: int, record_format: str, *values) -> bytes:
+    return bytes([local_message_type]) + struct.pack(record_format, *values)
+
+
+# A file_id definition (local type 0) followed by one data message
+FILE_ID_DATA = bytes([0x40, 0, 0, 0, 0, 2, 0, 1, 0x00, 1, 2, 0x84, 0x00, 4, 0x00, 0x01])
+
+
+def test_crc_known_value():
+    assert CRCCalculator.compute(b'') == 0
+    assert CRCCalculator.compute(b'123456789') == 0xBB3D
+
+
+def test_crc_update_matches_new_byte():
+    data = bytes(range(0, 256)) * 3 + b'\x01'
+
+    byte_by_byte = CRCCalculator()
+    for byte in data:
+        byte_by_byte.new_byte(byte)
+
+    streamed = CRCCalculator()
+    streamed.update(data[:101])
+    streamed.update(memoryview(data)[101:])
+
+    assert streamed.current == byte_by_byte.current == CRCCalculator.compute(data) == bitwise_crc(data)
+
+
+@pytest.mark.parametrize('header_size', [12, 14])
+def test_decode_file_crc(header_size: int):
+    file = Decoder(ByteReader(fit_file(FILE_ID_DATA, header_size))).decode_file()
+    assert len(file.records) == 2
+
+    corrupted = bytearray(fit_file(FILE_ID_DATA, header_size))
+    corrupted[-3] = corrupted[-3] ^ 0xFF
+    with pytest.raises(FITFileContentError):
+        Decoder(ByteReader(bytes(corrupted))).decode_file()
+
+
+@pytest.mark.parametrize('buffer_type', [bytes, bytearray, memoryview])
+def test_byte_reader_buffers(buffer_type):
+    reader = ByteReader(buffer_type(bytes([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17])))
+    assert reader.read_byte() == 1
+    assert reader.read_double_byte() == 0x0302
+    assert reader.read_quad_byte() == 0x07060504
+    assert reader.read_octo_byte() == 0x0F0E0D0C0B0A0908
+    assert bytes(reader.read_bytes(2)) == bytes([16, 17])
+    assert reader.bytes_left() == 0
+
+    with pytest.raises(FITFileContentError):
+        reader.read_byte()
+
+
+def test_decode_fit_file(tmp_path):
+    file_name = str(tmp_path / 'file_id.fit')
+    with open(file_name, 'wb') as file:
+        file.write(fit_file(FILE_ID_DATA))
+
+    assert len(Decoder.decode_fit_file(file_name).records) == 2
+
+    with open(file_name, 'wb') as file:
+        file.write(fit_file(FILE_ID_DATA)[:-5])
+
+    with pytest.raises(FITFileContentError):
+        Decoder.decode_fit_file(file_name)
+
+    with open(file_name, 'wb'):
+        pass
+
+    with pytest.raises(FITFileContentError):
+        Decoder.decode_fit_file(file_name)
+
+
+def test_compile_record_layout():
+    field_definitions = (
+        FieldDefinition(253, 4, True, UnsignedInt32.metadata().base_type_number),
+        FieldDefinition(1, 6, True, UnsignedInt16.metadata().base_type_number),
+        FieldDefinition(2, 4, False, String.metadata().base_type_number),
+        FieldDefinition(3, 1, False, UnsignedInt8.metadata().base_type_number),
+    )
+    developer_field_definitions = (DeveloperFieldDefinition(0, 2, 0),)
+
+    layout = Decoder.compile_record_layout(Architecture.BigEndian, field_definitions, developer_field_definitions)
+    assert layout.size == 17
+    assert layout.timestamp_position == 0
+    assert pickle.loads(pickle.dumps(layout)) == layout
+
+    decoder = Decoder(ByteReader(struct.pack('>I3H4sB', 1000, 1, 2, 3, b'ab\x00\x00', 7) + bytes([8, 9])))
+    values = decoder.reader.unpack(layout.record_struct)
+    assert values == (1000, 1, 2, 3, b'ab\x00\x00', 7, 8, 9)
+
+    with pytest.raises(FITFileContentError):
+        Decoder.compile_record_layout(Architecture.LittleEndian, (FieldDefinition(1, 3, True, UnsignedInt16.metadata().base_type_number),), ())
+
+    with pytest.raises(FITFileContentError):
+        Decoder.compile_record_layout(Architecture.LittleEndian, (FieldDefinition(253, 2, True, UnsignedInt16.metadata().base_type_number),), ())
+
+
+def test_decode_message_content():
+    file = Decoder(ByteReader(fit_file(FILE_ID_DATA))).decode_file()
+    content = file.records[1].content
+
+    assert isinstance(content, MessageContent)
+    assert [field.value for field in content.fields] == [4, 256]
+    assert isinstance(content.fields[1].value, UnsignedInt16)
+
+
+def test_decode_file_columnar():
+    data = definition_record(0, 20, [(253, 4, 0x86), (3, 1, 0x02), (7, 4, 0x84)]) + \
+        data_record(0, '<IB2H', 10, 100, 1, 2) + \
+        definition_record(1, 20, [(253, 4, 0x86), (7, 6, 0x84), (4, 1, 0x02)]) + \
+        data_record(1, '<I3HB', 11, 3, 4, 5, 50) + \
+        data_record(0, '<IB2H', 12, 101, 6, 7) + \
+        definition_record(2, 21, [(0, 4, 0x88), (1, 3, 0x07)]) + \
+        data_record(2, '<f3s', 1.5, b'ab\x00')
+
+    columns = Decoder(ByteReader(fit_file(data))).decode_file_columnar()
+
+    records = columns[20]
+    assert records.dtype.names == ('253', '3', '7', '4')
+    assert records['253'].tolist() == [10, 11, 12]
+    assert records['3'].tolist() == [100, 0xFF, 101]
+    assert records['4'].tolist() == [0xFF, 50, 0xFF]
+    assert records['7'].tolist() == [[1, 2, 0xFFFF], [3, 4, 5], [6, 7, 0xFFFF]]
+
+    assert columns[21]['0'].tolist() == [1.5]
+    assert columns[21]['1'].tolist() == [b'ab']
+
+
+@pytest.mark.parametrize('scalar_records', [2, 3])
+def test_decode_file_columnar_scalar_redefined_as_array(scalar_records: int):
+    data = definition_record(0, 20, [(253, 4, 0x86), (7, 2, 0x84)])
+    for i in range(0, scalar_records):
+        data = data + data_record(0, '<IH', 10 + i, 5)
+    data = data + definition_record(0, 20, [(253, 4, 0x86), (7, 6, 0x84)]) + data_record(0, '<I3H', 20, 1, 2, 3)
+
+    records = Decoder(ByteReader(fit_file(data))).decode_file_columnar()[20]
+    assert records['7'].tolist() == [[5, 0xFFFF, 0xFFFF]] * scalar_records + [[1, 2, 3]]
+
+
+def test_stream_byte_reader():
+    data = bytes(range(0, 200))
+    reader = StreamByteReader(io.BytesIO(data), chunk_size=7)
+    assert reader.read_byte() == 0
+    assert reader.read_double_byte() == 0x0201
+    assert bytes(reader.read_bytes(50)) == data[3:53]
+    assert bytes(reader.read_bytes(147)) == data[53:]
+    assert reader.crc() == CRCCalculator.compute(data)
+
+    with pytest.raises(FITFileContentError):
+        reader.read_byte()
+
+
+@pytest.mark.parametrize('source_type', ['file_name', 'stream'])
+def test_iter_records(tmp_path, source_type: str):
+    content = fit_file(FILE_ID_DATA + data_record(0, '<BH', 5, 2))
+    file_name = str(tmp_path / 'file_id.fit')
+    with open(file_name, 'wb') as file:
+        file.write(content)
+
+    source = file_name if source_type == 'file_name' else io.BytesIO(content)
+    records = Decoder.iter_records(source)
+    assert next(records) == Decoder.decode_fit_file(file_name).records[0]
+    assert tuple(records) == Decoder.decode_fit_file(file_name).records[1:]
+
+    # The CRC is only checked once every record has been yielded
+    corrupted = bytearray(content)
+    corrupted[-1] = corrupted[-1] ^ 0xFF
+    records = Decoder.iter_records(io.BytesIO(bytes(corrupted)))
+    assert len([next(records) for _ in range(0, 3)]) == 3
+    with pytest.raises(FITFileContentError):
+        next(records)
+
+
+def test_push_decoder():
+    content = fit_file(FILE_ID_DATA + data_record(0, '<BH', 5, 2))
+    expected = Decoder(ByteReader(content)).decode_file().records
+
+    # Byte by byte feeding, two chained files
+    push_decoder = PushDecoder()
+    records = []
+    for byte in content + fit_file(FILE_ID_DATA, 12):
+        records.extend(push_decoder.feed(bytes([byte])))
+    push_decoder.close()
+
+    assert tuple(records) == expected + expected[:2]
+
+    push_decoder = PushDecoder()
+    assert push_decoder.feed(content[:27]) == expected[:1]
+    assert push_decoder.feed(content[27:34]) == expected[1:3]
+    with pytest.raises(FITFileContentError):
+        push_decoder.close()
+
+    # A corrupt header is rejected before any record is received
+    corrupted = bytearray(content)
+    corrupted[12] = corrupted[12] ^ 0xFF
+    with pytest.raises(FITFileContentError):
+        PushDecoder().feed(corrupted[:14])
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_decode_chained_fit_file(tmp_path, workers: int):
+    segments = [fit_file(FILE_ID_DATA), fit_file(FILE_ID_DATA + data_record(0, '<BH', 5, 2), 12), fit_file(FILE_ID_DATA)]
+    file_name = str(tmp_path / 'chained.fit')
+    with open(file_name, 'wb') as file:
+        file.write(b''.join(segments))
+
+    assert Decoder.find_segments(b''.join(segments)) == ((0, 32), (32, 66), (66, 98))
+
+    files = Decoder.decode_chained_fit_file(file_name, workers)
+    assert files == tuple(Decoder(ByteReader(segment)).decode_file() for segment in segments)
+
+    with open(file_name, 'wb') as file:
+        file.write(b''.join(segments)[:-1])
+
+    with pytest.raises(FITFileContentError):
+        Decoder.decode_chained_fit_file(file_name, workers)
+
+
+def test_decode_selected_messages():
+    data = FILE_ID_DATA + \
+        definition_record(1, 20, [(253, 4, 0x86), (3, 1, 0x02)]) + \
+        data_record(1, '<IB', 1000, 100) + \
+        definition_record(2, 21, [(0, 1, 0x02)]) + \
+        data_record(0x80 | (2 << 5) | 5, '<B', 7)
+    content = fit_file(data)
+
+    def global_message_numbers(records):
+        return [record.content.global_message_number for record in records if isinstance(record.content, MessageDefinition)]
+
+    assert global_message_numbers(Decoder(ByteReader(content)).decode_file().records) == [0, 20, 21]
+
+    file = Decoder(ByteReader(content), exclude_messages=[20]).decode_file()
+    assert global_message_numbers(file.records) == [0, 21]
+    assert len(file.records) == 4
+
+    # The timestamp of skipped records is still tracked for compressed timestamp headers
+    assert file.records[-1].header.previous_Timestamp == 1000
+
+    file = Decoder(ByteReader(content), include_messages={0, 20}, exclude_messages={0}).decode_file()
+    assert [type(record.content) for record in file.records] == [MessageDefinition, MessageContent]
+    assert file.records[1].content.fields[1].value == 100
+
+    columns = Decoder(ByteReader(content), include_messages={21}).decode_file_columnar()
+    assert list(columns.keys()) == [21]
+
+
+def test_decode_projected_fields():
+    data = definition_record(0, 20, [(253, 4, 0x86), (3, 1, 0x02), (7, 4, 0x84), (4, 1, 0x02)]) + \
+        data_record(0, '<IB2HB', 10, 100, 1, 2, 50)
+    content = fit_file(data)
+
+    file = Decoder(ByteReader(content), projection={20: [4]}).decode_file()
+    assert [field.value for field in file.records[1].content.fields] == [10, None, None, 50]
+
+    columns = Decoder(ByteReader(content), projection={20: [3]}).decode_file_columnar()
+    assert columns[20].dtype.names == ('253', '3')
+    assert columns[20]['3'].tolist() == [100]
+
+    # Messages without a projection are fully decoded
+    file = Decoder(ByteReader(content), projection={21: [0]}).decode_file()
+    assert [field.value for field in file.records[1].content.fields] == [10, 100, (1, 2), 50]
+
+
+def test_decode_big_endian():
+    field_definitions = [(253, 4, 0x86), (7, 6, 0x84), (2, 2, 0x83), (0, 4, 0x88)]
+    values = (1000, 1, 2, 0x0102, -3, 1.5)
+    little_endian = fit_file(definition_record(0, 0x0114, field_definitions, 0) + data_record(0, '<I3Hhf', *values))
+    big_endian = fit_file(definition_record(0, 0x0114, field_definitions, 1) + data_record(0, '>I3Hhf', *values))
+
+    little_endian_file = Decoder(ByteReader(little_endian)).decode_file()
+    big_endian_file = Decoder(ByteReader(big_endian)).decode_file()
+    assert big_endian_file.records[0].content.architecture == Architecture.BigEndian
+    assert big_endian_file.records[0].content.global_message_number == 0x0114
+    assert big_endian_file.records[1] == little_endian_file.records[1]
+    assert [field.value for field in big_endian_file.records[1].content.fields] == [1000, (1, 2, 0x0102), -3, 1.5]
+
+    columns = Decoder(ByteReader(big_endian)).decode_file_columnar()[0x0114]
+    assert columns.dtype['7'].base.isnative
+    assert columns['7'].tolist() == [[1, 2, 0x0102]]
+    assert columns['2'].tolist() == [-3]
+
+    decoder = Decoder(ByteReader(struct.pack('>2H', 0x0102, 0x0304)))
+    assert decoder.decode_field(FieldDefinition(1, 4, True, UnsignedInt16.metadata().base_type_number), Architecture.BigEndian).value == (0x0102, 0x0304)
+
+
+def compressed_timestamp_record(local_message_type: int, time_offset: int, record_format: str, *values) -> bytes:
+    return bytes([0x80 | (local_message_type << 5) | time_offset]) + struct.pack(record_format, *values)
+
+
+def test_resolve_compressed_timestamps():
+    data = definition_record(0, 20, [(3, 1, 0x02)]) + \
+        compressed_timestamp_record(0, 3, '<B', 1) + \
+        definition_record(1, 21, [(253, 4, 0x86)]) + \
+        data_record(1, '<I', 1000) + \
+        compressed_timestamp_record(0, 1000 % 32 + 5, '<B', 2) + \
+        compressed_timestamp_record(0, 2, '<B', 3) + \
+        compressed_timestamp_record(0, 2, '<B', 4) + \
+        compressed_timestamp_record(0, 31, '<B', 5) + \
+        data_record(1, '<I', 2000) + \
+        compressed_timestamp_record(0, 2000 % 32, '<B', 6)
+    content = fit_file(data)
+
+    # 1000 has 8 as its 5 least significant bits, the offsets 2 and 31 roll over
+    expected = [None, 1005, 1026, 1026, 1055, 2000]
+
+    records = Decoder(ByteReader(content)).decode_file().records
+    assert [record.header.timestamp for record in records if isinstance(record.header, CompressedTimestampRecordHeader)] == expected
+
+    columns = Decoder(ByteReader(content)).decode_file_columnar()
+    assert columns[20]['253'].tolist() == [0xFFFFFFFF] + expected[1:]
+    assert columns[20]['3'].tolist() == [1, 2, 3, 4, 5, 6]
+
+    # Timestamps from messages that are not selected are still used
+    columns = Decoder(ByteReader(content), include_messages={20}).decode_file_columnar()
+    assert columns[20]['253'].tolist() == [0xFFFFFFFF] + expected[1:]
+
+
+@pytest.mark.parametrize('timestamp, expected', [(0xFFFFFFFF, 0xFFFFFFFF), (0xFFFFFFF0, 2)])
+def test_resolve_compressed_timestamps_invalid_and_rollover(timestamp: int, expected: int):
+    # An invalid timestamp field is no reference for the compressed timestamps, a valid one near 2^32 rolls over
+    data = definition_record(0, 20, [(253, 4, 0x86)]) + \
+        data_record(0, '<I', timestamp) + \
+        definition_record(1, 21, [(3, 1, 0x02)]) + \
+        compressed_timestamp_record(1, 2, '<B', 1) + \
+        compressed_timestamp_record(1, 3, '<B', 2)
+    content = fit_file(data)
+
+    records = Decoder(ByteReader(content)).decode_file().records
+    row_timestamps = [record.header.timestamp for record in records if isinstance(record.header, CompressedTimestampRecordHeader)]
+    assert row_timestamps == [expected, expected if expected == 0xFFFFFFFF else expected + 1]
+    assert [record.header.timestamp for record in PushDecoder().feed(content) if isinstance(record.header, CompressedTimestampRecordHeader)] == row_timestamps
+
+    columns = Decoder(ByteReader(content)).decode_file_columnar()
+    assert columns[21]['253'].tolist() == row_timestamps
+    assert columns[21]['3'].tolist() == [1, 2]
+
+
+def test_message_definition_cache():
+    content = fit_file(FILE_ID_DATA + definition_record(1, 0, [(0, 1, 0x00), (1, 2, 0x84)]))
+
+    DEFINITION_CACHE.clear()
+    first = Decoder(ByteReader(content)).decode_file().records
+    second = Decoder(ByteReader(content)).decode_file().records
+    assert first[0].content is first[2].content is second[0].content
+    assert DEFINITION_CACHE.info().misses == 1
+    assert DEFINITION_CACHE.info().hits == 3
+
+    # Projections compile different layouts for the same bytes
+    projected = Decoder(ByteReader(content), projection={0: [1]}).decode_file().records
+    assert projected[0].content is not first[0].content
+    assert projected[0].content.layout.fields[0][0] is None
+
+    cache = MessageDefinitionCache(1)
+    cache.get(bytes([0, 0, 0, 0, 0]))
+    cache.get(bytes([0, 0, 1, 0, 0]))
+    cache.get(bytes([0, 0, 0, 0, 0]))
+    assert cache.info().misses == 3
+    assert cache.info().currsize == 1
+
+    with pytest.raises(FITFileContentError):
+        cache.get(bytes([1, 0, 0, 0, 0]))
+
+
+def test_message_decoder_dispatch():
+    pytest.importorskip('FIT.messages')
+
+    content = fit_file(FILE_ID_DATA + definition_record(1, 0xFF00, [(0, 1, 0x02)]) + data_record(1, '<B', 3) + data_record(0, '<BH', 5, 2))
+    message_decoder = MessageDecoder()
+    with pytest.warns(FITFileContentWarning):
+        messages = tuple(message_decoder.decode_records(Decoder(ByteReader(content)).decode_file().records))
+
+    assert [type(message).__name__ for message in messages] == ['FileId', 'ManufacturerSpecificMessage', 'FileId']
+    assert message_decoder.local_dispatch[1][1].is_manufacturer_specific
+    assert message_decoder.local_dispatch[0][1] is MessageDecoder.dispatch_table()[0]
+
+    # The positional constructors give the same messages as the extracted fields ones
+    entry = MessageDecoder.dispatch_table()[0]
+    definition, data = [record.content for record in Decoder(ByteReader(content)).decode_file().records[0:2]]
+    assert entry.positional_materializer is not None
+    extracted_fields = Decoder.extract_fields(data, definition, entry.expected_field_numbers)
+    assert entry.positional_materializer(data.fields + Decoder.MISSING_FIELD, definition.field_positions, None, (), (), False) == entry.materializer(extracted_fields, (), (), False)
+
+    message_decoder.reset_definitions()
+    with pytest.raises(FITFileContentError):
+        message_decoder.decode_record(Decoder(ByteReader(content)).decode_file().records[1])
+
+
+def test_convert_columns():
+    messages = pytest.importorskip('FIT.messages')
+
+    data = definition_record(0, 20, [(253, 4, 0x86), (5, 4, 0x86), (78, 4, 0x86), (3, 1, 0x02)]) + \
+        data_record(0, '<3IB', 1000, 350, 3000, 120) + \
+        data_record(0, '<3IB', 1001, 0xFFFFFFFF, 3005, 121)
+    columns = Decoder(ByteReader(fit_file(data))).decode_file_columnar()[20]
+
+    converted = Decoder.convert_columns(columns, messages.Record)
+    assert converted.dtype.names == ('timestamp', 'heart_rate', 'distance', 'enhanced_altitude')
+    assert converted['timestamp'].tolist() == [1000, 1001]
+    assert converted['heart_rate'].tolist() == [120, 121]
+    assert converted['distance'][0] == 3.5
+    assert np.isnan(converted['distance'][1])
+    assert converted['enhanced_altitude'].tolist() == [100.0, 101.0]
+    assert messages.Record.field_units()['distance'] == messages.Unit.m
+
+
+def test_expand_components():
+    messages = pytest.importorskip('FIT.messages')
+
+    # compressed_speed_distance holds a 12 bit speed in 1/100 m/s followed by a 12 bit accumulated distance
+    data = definition_record(0, 20, [(253, 4, 0x86), (8, 3, 0x0D), (2, 2, 0x84)]) + \
+        data_record(0, '<I3BH', 1000, 0x34, 0x52, 0x01, 3000) + \
+        definition_record(1, 20, [(253, 4, 0x86), (6, 2, 0x84)]) + \
+        data_record(1, '<IH', 1001, 4000) + \
+        data_record(0, '<I3BH', 1002, 0xFF, 0xFF, 0xFF, 0xFFFF)
+    content = fit_file(data)
+
+    records = [message for message in MessageDecoder().decode_records(Decoder(ByteReader(content)).decode_file().records) if isinstance(message, messages.Record)]
+
+    # The speed component goes to speed (1/1000 m/s), which expands in turn to enhanced_speed
+    assert [record.speed for record in records] == [5640, 4000, None]
+    assert [record.enhanced_speed for record in records] == [5640, 4000, None]
+    assert [record.enhanced_altitude for record in records] == [3000, None, None]
+
+    columns = Decoder(ByteReader(content)).decode_file_columnar()[20]
+    expanded = Decoder.expand_components(columns, messages.Record)
+    assert expanded['6'].tolist() == [5640, 4000, 0xFFFF]
+    assert expanded['73'].tolist() == [5640, 4000, 0xFFFFFFFF]
+    assert expanded['78'].tolist() == [3000, 0xFFFFFFFF, 0xFFFFFFFF]
+
+    assert Decoder.expand_component((0x34, 0x52, 0x01), messages.Record.component_expansions()[1]) == 5640
+
+
+def test_expand_dynamic_field_components():
+    messages = pytest.importorskip('FIT.messages')
+
+    # The data of a rear_gear_change event (43) is read as gear_change_data, whose components are the gears, the data of a timer event (0) is not
+    gears = 5 | (21 << 8) | (2 << 16) | (39 << 24)
+    data = definition_record(0, 21, [(253, 4, 0x86), (0, 1, 0x00), (3, 4, 0x86)]) + \
+        data_record(0, '<IBI', 1000, 43, gears) + \
+        data_record(0, '<IBI', 1001, 0, 7)
+    content = fit_file(data)
+
+    events = [message for message in MessageDecoder().decode_records(Decoder(ByteReader(content)).decode_file().records) if isinstance(message, messages.Event)]
+    assert [(event.rear_gear_num, event.rear_gear, event.front_gear_num, event.front_gear) for event in events] == [(5, 21, 2, 39), (None, None, None, None)]
+
+    expanded = Decoder.expand_components(Decoder(ByteReader(content)).decode_file_columnar()[21], messages.Event)
+    assert [expanded[str(number)].tolist() for number in (11, 12, 9, 10)] == [[5, 0], [21, 0], [2, 0], [39, 0]]
+
+
+def test_accumulator():
+    values = np.array([4000, 4090, 10, 100, 7, 20, 4000])
+    is_reset = np.array([False, False, False, False, True, False, False])
+
+    accumulator = Accumulator()
+    accumulated = accumulator.accumulate('distance', values[:3], 12).tolist() + accumulator.accumulate('distance', values[3:], 12, is_reset[3:]).tolist()
+    assert accumulated == [4000, 4090, 4106, 4196, 7, 20, 4000]
+
+    accumulator = Accumulator()
+    expected = []
+    for value, reset in zip(values.tolist(), is_reset.tolist()):
+        if reset:
+            accumulator.set('distance', value)
+            expected.append(value)
+        else:
+            expected.append(accumulator.accumulate_value('distance', value, 12))
+    assert expected == accumulated
+
+
+def test_accumulate_components():
+    messages = pytest.importorskip('FIT.messages')
+
+    def compressed_speed_distance(speed: int, distance: int) -> bytes:
+        return (speed | (distance << 12)).to_bytes(3, 'little')
+
+    # Distances of 4000, 4090 and then 10, which rolls over the 12 bits, in 1/16 m, then a full distance in 1/100 m restarts the total
+    # and the next compressed distance carries the 12 least significant bits of the new total
+    data = definition_record(0, 20, [(253, 4, 0x86), (8, 3, 0x0D)]) + \
+        data_record(0, '<I', 1000) + compressed_speed_distance(100, 4000) + \
+        data_record(0, '<I', 1001) + compressed_speed_distance(100, 4090) + \
+        data_record(0, '<I', 1002) + compressed_speed_distance(100, 10) + \
+        definition_record(1, 20, [(253, 4, 0x86), (5, 4, 0x86)]) + \
+        data_record(1, '<2I', 1003, 100000) + \
+        data_record(0, '<I', 1004) + compressed_speed_distance(100, (16000 + 16) & 0xFFF)
+    content = fit_file(data)
+    expected = [25000, 25562, 25662, 100000, 100100]
+
+    # Feeding the records in two batches gives the same distances
+    records = Decoder(ByteReader(content)).decode_file().records
+    message_decoder = MessageDecoder()
+    messages_decoded = list(message_decoder.decode_records(records[:4])) + list(message_decoder.decode_records(records[4:]))
+    assert [message.distance for message in messages_decoded if isinstance(message, messages.Record)] == expected
+
+    # Generated code without from_field_values goes through from_extracted_fields, with the same accumulation
+    message_decoder = MessageDecoder()
+    message_decoder.dispatch = {number: dataclasses.replace(entry, positional_materializer=None) for number, entry in message_decoder.dispatch.items()}
+    messages_decoded = list(message_decoder.decode_records(records))
+    assert [message.distance for message in messages_decoded if isinstance(message, messages.Record)] == expected
+
+    columns = Decoder(ByteReader(content)).decode_file_columnar()[20]
+    accumulator = Accumulator()
+    expanded = np.concatenate([Decoder.expand_components(columns[:2], messages.Record, accumulator), Decoder.expand_components(columns[2:], messages.Record, accumulator)])
+    assert expanded['5'].tolist() == expected
+
+    # Without an accumulator accumulated components are left alone
+    assert Decoder.expand_components(columns, messages.Record)['5'].tolist()[0] == 0xFFFFFFFF
+
+
+def test_developer_fields():
+    pytest.importorskip('FIT.messages')
+
+    # developer_data_id, field_description of a uint16 power field, then a record with that field and a field without description
+    data = definition_record(0, 207, [(3, 1, 0x02)]) + \
+        data_record(0, '<B', 0) + \
+        definition_record(1, 206, [(0, 1, 0x02), (1, 1, 0x02), (2, 1, 0x02), (3, 8, 0x07), (8, 4, 0x07)]) + \
+        data_record(1, '<3B8s4s', 0, 0, 0x84, 'Power'.encode('utf-8'), b'W') + \
+        bytes([0x40 | 0x20 | 2]) + definition_record(2, 20, [(253, 4, 0x86)])[1:] + bytes([2, 0, 2, 0, 1, 1, 0]) + \
+        data_record(2, '<IHB', 1000, 250, 7)
+    content = fit_file(data)
+
+    records = Decoder(ByteReader(content)).decode_file().records
+    assert records[4].content.developer_field_definitions[0].developer_data_index == 0
+
+    message_decoder = MessageDecoder()
+    messages = [message for message in message_decoder.decode_records(records)]
+    description = message_decoder.developer_field_cache.description(0, 0)
+    assert (description.name, description.units, description.type_class) == ('Power', 'W', UnsignedInt16)
+
+    power, unknown = messages[-1].developer_fields
+    assert power.value == 250
+    assert isinstance(power.value, UnsignedInt16)
+    assert power.description is description
+    assert unknown.description is None
+    assert unknown.value == 7
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_decode_many(tmp_path, workers: int):
+    contents = [fit_file(FILE_ID_DATA), fit_file(FILE_ID_DATA)[:-1], fit_file(FILE_ID_DATA + data_record(0, '<BH', 5, 2))] * 2
+    paths = []
+    for i, content in enumerate(contents):
+        paths.append(tmp_path / f'{i}.fit')
+        with open(paths[-1], 'wb') as file:
+            file.write(content)
+
+    results = list(Decoder.decode_many(paths, workers, chunk_size=2))
+    assert [result.index for result in results] == list(range(0, len(paths)))
+    assert [result.ok for result in results] == [True, False, True] * 2
+    assert isinstance(results[1].error, FITFileContentError)
+    assert results[2].value == Decoder.decode_fit_file(str(paths[2]))
+
+    results = sorted(Decoder.decode_many(paths, workers, DecodeMode.Columnar, ordered=False), key=lambda result: result.index)
+    assert [result.path for result in results] == [str(path) for path in paths]
+    assert results[2].value[0]['1'].tolist() == [256, 2]
+
+    results = list(Decoder.decode_many(paths, workers, DecodeMode.Columnar, shared_memory=True))
+    shared = results[2].value[0]
+    assert isinstance(shared, SharedArray)
+    assert len(pickle.dumps(shared)) < 1024
+    array = shared.array()
+    assert np.array_equal(array, Decoder.decode_fit_columnar(str(paths[2]))[0])
+    del array
+    for result in results:
+        result.release()
+    with pytest.raises(FileNotFoundError):
+        SharedArray(shared.name, shared.dtype, shared.shape).array()
+    with pytest.raises(ValueError):
+        Decoder.decode_many(paths, workers, DecodeMode.File, shared_memory=True)
+    with pytest.raises(ValueError):
+        Decoder.decode_many(paths, 0)
+
+    pytest.importorskip('FIT.messages')
+    manufacturer_specific = tmp_path / 'manufacturer_specific.fit'
+    with open(manufacturer_specific, 'wb') as file:
+        file.write(fit_file(definition_record(0, 0xFF00, [(0, 1, 0x02)]) + data_record(0, '<B', 3)))
+
+    results = list(Decoder.decode_many([paths[0], manufacturer_specific], workers, DecodeMode.Messages))
+    assert [type(message).__name__ for message in results[0].value] == ['FileId']
+    assert results[1].ok
+    assert [type(warning) for warning in results[1].warnings] == [FITFileContentWarning, FITFileContentWarning]
+    assert 'manufacturer specific' in str(results[1].warnings[0])
+
+
+ABANDON_SHARED_ARRAYS = """
+import sys
+from FIT.decoder import Decoder, DecodeMode
+for result in Decoder.decode_many(sys.argv[2:], int(sys.argv[1]), DecodeMode.Columnar, chunk_size=1, shared_memory=True):
+    print(result.value[0].name)
+    break
+"""
+
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason='Shared memory blocks are not listed in /dev/shm')
+@pytest.mark.parametrize('workers', [1, 2])
+def test_decode_many_abandoned_shared_arrays(tmp_path, workers: int):
+    paths = []
+    for i in range(0, 4):
+        paths.append(str(tmp_path / f'{i}.fit'))
+        with open(paths[-1], 'wb') as file:
+            file.write(fit_file(FILE_ID_DATA + data_record(0, '<BH', i, 2)))
+
+    # The iteration stops early and no handle is released, the blocks must still be unlinked once the process exits
+    before = set(os.listdir('/dev/shm'))
+    process = subprocess.run([sys.executable, '-c', ABANDON_SHARED_ARRAYS, str(workers)] + paths, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    assert process.stdout.decode().strip().startswith('psm_')
+
+    # The resource tracker unlinks the blocks after the process has exited
+    deadline = time.monotonic() + 10
+    while set(os.listdir('/dev/shm')) - before and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert set(os.listdir('/dev/shm')) - before == set()
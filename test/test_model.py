@@ -2,6 +2,78 @@
 # See LICENSE for details
 
 
+import pickle
 import pytest
 
-# TODO test model
\ No newline at end of file
+from dataclasses import dataclass, FrozenInstanceError
+
+from FIT.base_types import UnsignedInt8, UnsignedInt16
+from FIT.model import MessageDefinition, FieldDefinition, DeveloperFieldDefinition, Architecture, MessageMetadata, NormalFieldMetadata, DynamicFieldMetadata, Message, SparseMessage, SparseField
+
+
+@dataclass(frozen=True)
+class SlotsMessage(Message):
+    __slots__ = ('heart_rate', 'cadence', 'speed')
+
+    heart_rate: UnsignedInt8
+    cadence: UnsignedInt8
+    speed: UnsignedInt16
+
+
+class SparseRecordMessage(SparseMessage):
+    __slots__ = ()
+
+    heart_rate = SparseField(0)
+    cadence = SparseField(1)
+    speed = SparseField(2)
+
+
+def test_message_definition_lookups():
+    field_definitions = (FieldDefinition(253, 4, True, 0x86), FieldDefinition(3, 1, False, 0x02))
+    developer_field_definitions = (DeveloperFieldDefinition(0, 2, 0),)
+    definition = MessageDefinition(0, Architecture.LittleEndian, 20, field_definitions, developer_field_definitions)
+
+    assert definition.field_positions[253] == 0
+    assert definition.field_positions[3] == 1
+    assert definition.field_positions[4] == -1
+    assert len(definition.field_positions) == 256
+    assert definition.field_definition(3) == (1, field_definitions[1])
+    assert definition.developer_field_definition(0) == (0, developer_field_definitions[0])
+
+    # Each definition has its own lookups
+    other = MessageDefinition(0, Architecture.LittleEndian, 21, field_definitions[1:], ())
+    assert other.field_definition(3) == (0, field_definitions[1])
+    assert definition.field_definition(3) == (1, field_definitions[1])
+
+
+def test_message_metadata():
+    metadata = MessageMetadata((NormalFieldMetadata('event', 'event', 1, 0, '', 0), DynamicFieldMetadata('timer_trigger', 'timer_trigger', 1, 0, '', 'event', 'timer')))
+    assert metadata.field_numbers() == (0,)
+    assert metadata.field_names() == ('event', 'timer_trigger')
+
+
+@pytest.mark.parametrize('message_class', [SlotsMessage, SparseRecordMessage])
+def test_message_storage(message_class):
+    message = message_class((), (), UnsignedInt8(120), None, UnsignedInt16(3000))
+
+    assert not hasattr(message, '__dict__')
+    assert message_class.field_names() == ('developer_fields', 'undocumented_fields', 'heart_rate', 'cadence', 'speed')
+    assert (message.heart_rate, message.cadence, message.speed) == (120, None, 3000)
+    assert message._xstr_() == f'{message_class.__name__}(heart_rate=120, speed=3000)'
+    assert repr(message) == f'{message_class.__name__}(developer_fields=(), undocumented_fields=(), heart_rate=UnsignedInt8(120), cadence=None, speed=UnsignedInt16(3000))'
+
+    assert pickle.loads(pickle.dumps(message)) == message
+    assert message != message_class((), (), UnsignedInt8(120), UnsignedInt8(90), UnsignedInt16(3000))
+    assert hash(message) == hash(message_class((), (), UnsignedInt8(120), None, UnsignedInt16(3000)))
+
+    with pytest.raises(FrozenInstanceError):
+        message.cadence = UnsignedInt8(90)
+
+
+def test_sparse_message_values():
+    message = SparseRecordMessage((), (), None, UnsignedInt8(90), UnsignedInt16(3000))
+    assert message.present == 0b110
+    assert message.values == (90, 3000)
+
+    with pytest.raises(TypeError):
+        SparseRecordMessage((), (), None, None)
@@ -2,9 +2,11 @@
 # See LICENSE for details
 
 
+import os
 import pytest
 
-from FIT.profile import Profile, ProfileVersion, ProfileContentError, ProfileContentWarning, DEFAULT_PROFILE_CORRECTOR, ProfileCorrector
+from FIT.profile import Profile, ProfileVersion, ProfileContentError, ProfileContentWarning, DEFAULT_PROFILE_CORRECTOR, ProfileCorrector, NamedValueProfile, TypeProfile, ComponentProfile, \
+    DynamicFieldMatcher, MessageScalarFieldProfile, MessageComponentFieldProfile, MessageProfile
 from test.test_common import all_sdk_files
 
 
@@ -189,6 +191,59 @@ def test_sha256():
     assert False
 
 
+def json_test_profile() -> Profile:
+    types = (
+        TypeProfile('mesg_num', 'uint16', True, '', (NamedValueProfile('record', 20, ''), NamedValueProfile('mfg_range_min', '0xFF00', 'comment'))),
+        TypeProfile('date_time', 'uint32', False, '', ()),
+    )
+    fields = (
+        MessageScalarFieldProfile(253, 'timestamp', 'date_time', None, '', '', '', (), None, None, 's', False),
+        MessageComponentFieldProfile(2, 'altitude', 'uint16', '[N]', '', '', 1, (DynamicFieldMatcher('sport', 'running'),), (ComponentProfile('enhanced_altitude', 5, 500, 'm', 16, None),)),
+    )
+    return Profile(ProfileVersion.current(), types, (MessageProfile('record', fields),))
+
+
+def test_json():
+    profile = json_test_profile()
+    loaded = Profile.from_json(profile.to_json())
+    assert loaded == profile
+    assert isinstance(loaded.messages[0].fields[1], MessageComponentFieldProfile)
+    assert loaded.types[1].values == ()
+
+
+def test_indexes():
+    profile = json_test_profile()
+    assert profile.types_by_name['date_time'] is profile.types[1]
+    assert profile.messages_by_name['record'] is profile.messages[0]
+    assert profile.messages_by_number == {20: profile.messages[0]}
+
+    record = profile.messages_by_name['record']
+    assert record.fields_by_number[2].name == 'altitude'
+    assert record.fields_by_name['timestamp'] is record.fields_by_number[253]
+
+    # The indexes are not part of the value of the profile
+    assert profile == json_test_profile()
+    assert hash(record) == hash(json_test_profile().messages[0])
+    assert 'fields_by_name' not in repr(record)
+
+
+def test_cached_profile(tmp_path):
+    profile = json_test_profile()
+    corrector = DEFAULT_PROFILE_CORRECTOR[profile.version]
+    cache_file_name = Profile._cache_file_name(str(tmp_path / 'cache'), 'AB', profile.version, corrector, True)
+    assert cache_file_name != Profile._cache_file_name(str(tmp_path / 'cache'), 'AB', profile.version, corrector, False)
+    assert Profile._load_cached(cache_file_name) is None
+
+    Profile._store_cached(cache_file_name, profile)
+    assert Profile._load_cached(cache_file_name) == profile
+    assert os.listdir(str(tmp_path / 'cache')) == [os.path.basename(cache_file_name)]
+
+    # A corrupted cache is ignored
+    with open(cache_file_name, 'w') as file:
+        file.write('{"format_version": 1')
+    assert Profile._load_cached(cache_file_name) is None
+
+
 def test_units():
     # TODO test
     assert False